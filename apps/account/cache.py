@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from apps.account.models import Account, AccountSession
+
+
+def _token_cache_key(token_hash: str) -> str:
+    return f'account:session:{token_hash}'
+
+
+def get_token_session(token_hash: str) -> AccountSession | None:
+    """从缓存中获取token对应的会话（已关联账户），未命中时返回None"""
+    return cache.get(_token_cache_key(token_hash))
+
+
+def set_token_session(session: AccountSession):
+    """缓存token对应的会话，需已通过 select_related 关联账户
+
+    缓存为进程内缓存，多个 worker 之间不共享失效通知，缓存时间需保持较短
+    """
+    cache.set(_token_cache_key(session.token_hash), session, settings.AUTHENTICATION_CACHE_TIMEOUT)
+
+
+def delete_token_session(token_hash: str):
+    """清除当前进程中token对应会话的缓存"""
+    cache.delete(_token_cache_key(token_hash))
+
+
+def _delete_on_commit(hashes: list[str]):
+    """事务提交后清除会话缓存
+
+    提交前清除时，并发请求可能从数据库读到修改前的账户并重新写入缓存；不在事务中时立即清除
+    """
+    keys = [_token_cache_key(token_hash) for token_hash in hashes]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_account_token(account: Account):
+    """账户信息或状态发生变化时清除其所有会话的缓存，需在保存账户之后调用"""
+    _delete_on_commit(list(AccountSession.objects.filter(account_id=account.id).values_list('token_hash', flat=True)))
+
+
+def revoke_account_sessions(account_ids: list[int], device: str = None, ids: list[int] = None, excludes: list[int] = None) -> int:
+    """批量吊销账户的会话并清除缓存，返回吊销数量，参数同 AccountSession.revoke
+
+    只能清除当前进程的缓存，其他 worker 中写请求立即失效，只读请求最多延迟 AUTHENTICATION_CACHE_TIMEOUT 秒
+    """
+    hashes = AccountSession.revoke(account_ids, device=device, ids=ids, excludes=excludes)
+    _delete_on_commit(hashes)
+    return len(hashes)
+
+
+def refresh_token_expired(session: AccountSession):
+    """延长会话有效期
+
+    新的过期时间超出已保存的过期时间达到 AUTHENTICATION_REFRESH_THRESHOLD 时才写入数据库，
+    且只更新 expired 字段。只更新仍然可用的会话，之后清除缓存由下次请求从数据库重新读取，
+    避免本请求读取之后提交的吊销或禁用被过期的会话对象覆盖
+    """
+    now = timezone.now()
+    expired = now + timezone.timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME)
+    if (expired - session.expired).total_seconds() >= settings.AUTHENTICATION_REFRESH_THRESHOLD:
+        updated = AccountSession.objects.filter(id=session.id, expired__gte=now, account__is_active=True,
+                                                account__deleted_at__isnull=True).update(expired=expired)
+        if updated:
+            session.expired = expired
+        delete_token_session(session.token_hash)
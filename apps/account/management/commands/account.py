@@ -1,12 +1,12 @@
 from django.core.management.base import BaseCommand
-from apps.account.models import Account
+from apps.account.models import Account, AccountSession
 
 
 class Command(BaseCommand):
     help = '账户管理'
 
     def add_arguments(self, parser):
-        parser.add_argument('action', data_type=str, help='执行动作')
+        parser.add_argument('action', type=str, help='执行动作')
         parser.add_argument('-u', required=False, help='用户名')
         parser.add_argument('-p', required=False, help='账户密码')
         parser.add_argument('-n', required=False, help='账户昵称')
@@ -25,6 +25,7 @@ class Command(BaseCommand):
             account add    创建账户，例如：account add -u admin -p 123 -n 管理员 -s
             account reset  重置账户密码，例如：account reset -u admin -p 123
             account enable 启用被禁用的账户，例如：account enable -u admin
+            account purge  清理已过期及已吊销的登录会话，例如：account purge
         '''
         self.stdout.write(message)
 
@@ -67,6 +68,9 @@ class Command(BaseCommand):
             account.password_hash = Account.make_password(options['p'])
             account.save()
             self.echo_success('账户密码已重置')
+        elif action == 'purge':
+            count = AccountSession.purge()
+            self.echo_success(f'已清理{count}个登录会话')
         else:
             self.echo_error('未识别的操作')
             self.print_help()
\ No newline at end of file
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 09:32
+
+import hashlib
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def copy_access_tokens(apps, schema_editor):
+    """未过期的 access_token 迁移为会话，已登录的用户无需重新登录"""
+    Account = apps.get_model('account', 'Account')
+    AccountSession = apps.get_model('account', 'AccountSession')
+    accounts = Account.objects.filter(access_token__isnull=False, token_expired__gte=timezone.now(), deleted_at__isnull=True)
+    AccountSession.objects.bulk_create([
+        AccountSession(account_id=account.id, token_hash=hashlib.sha256(account.access_token.encode('utf-8')).hexdigest(),
+                       ip=account.last_ip or '', expired=account.token_expired)
+        for account in accounts.only('id', 'access_token', 'token_expired', 'last_ip')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_alter_account_email_alter_account_fullname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deleted_at', models.DateTimeField(default=None, null=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('device', models.CharField(default='', max_length=255)),
+                ('ip', models.CharField(default='', max_length=50)),
+                ('expired', models.DateTimeField(db_index=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='account.account')),
+            ],
+            options={
+                'db_table': 'account_session',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='accountsession',
+            index=models.Index(fields=['account', 'device'], name='account_session_device_idx'),
+        ),
+        migrations.RunPython(copy_access_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='account',
+            name='access_token',
+        ),
+        migrations.RemoveField(
+            model_name='account',
+            name='token_expired',
+        ),
+    ]
@@ -1,5 +1,8 @@
+import hashlib
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
+from django.utils import timezone
 from libs.boost.mixin import ModelMixin
 from enum import Enum
 from django.db.models import UniqueConstraint
@@ -20,8 +23,6 @@ class Account(ModelMixin):
     is_super= models.BooleanField(default=False)
     # 激活状态
     is_active = models.BooleanField(default=True)
-    access_token = models.CharField(max_length=32, null=True, blank=True)
-    token_expired = models.DateTimeField(null=True, default=None)
     last_login = models.DateTimeField(null=True, default=None)
     last_ip = models.CharField(max_length=20)
 
@@ -43,6 +44,73 @@ class Account(ModelMixin):
         ]
 
 
+class AccountSession(ModelMixin):
+    """登录会话，同一账户每台设备一条记录
+
+    数据库中只保存token的sha256摘要，token_hash 建有唯一索引；
+    吊销时标记 deleted_at，过期及已吊销的记录由 account purge 命令清理
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='sessions')
+    token_hash = models.CharField(max_length=64, unique=True)
+    # 客户端传入的设备标识，未传入时使用 User-Agent
+    device = models.CharField(max_length=255, default='')
+    ip = models.CharField(max_length=50, default='')
+    expired = models.DateTimeField(db_index=True)
+
+    @staticmethod
+    def hash_token(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def issue(cls, account: Account, device: str = '', ip: str = '') -> tuple['AccountSession', str]:
+        """创建会话，返回会话及明文token，明文token只在此处出现一次"""
+        token = uuid.uuid4().hex
+        session = cls.objects.create(account=account, token_hash=cls.hash_token(token), device=device[:255], ip=ip,
+                                     expired=timezone.now() + timezone.timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME))
+        return session, token
+
+    @classmethod
+    def revoke(cls, account_ids: list[int], device: str = None, ids: list[int] = None, excludes: list[int] = None) -> list[str]:
+        """批量吊销账户的会话
+
+        Args:
+            account_ids (list[int]): 账户主键
+            device (str, optional): 只吊销该设备的会话. Defaults to None.
+            ids (list[int], optional): 只吊销指定主键的会话. Defaults to None.
+            excludes (list[int], optional): 不吊销的会话主键. Defaults to None.
+
+        Returns:
+            list[str]: 被吊销会话的 token_hash，用于清除缓存
+        """
+        sessions = cls.objects.filter(account_id__in=account_ids)
+        if device is not None:
+            sessions = sessions.filter(device=device[:255])
+        if ids is not None:
+            sessions = sessions.filter(id__in=ids)
+        if excludes:
+            sessions = sessions.exclude(id__in=excludes)
+        hashes = list(sessions.values_list('token_hash', flat=True))
+        if hashes:
+            cls.objects.filter(token_hash__in=hashes).update(deleted_at=timezone.now())
+        return hashes
+
+    @classmethod
+    def purge(cls) -> int:
+        """物理删除已过期及已吊销的会话，返回删除数量"""
+        count, _ = cls.all_objects.filter(models.Q(deleted_at__isnull=False) | models.Q(expired__lt=timezone.now())).delete()
+        return count
+
+    def __repr__(self):
+        return '<AccountSession %r %r>' % (self.account_id, self.device)
+
+    class Meta:
+        db_table = 'account_session'
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['account', 'device'], name='account_session_device_idx'),
+        ]
+
+
 class LoginLog(ModelMixin):
     username = models.CharField(max_length=20)
     ip = models.CharField(max_length=50)
@@ -1,6 +1,12 @@
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from apps.account.models import Account, AccountEmailAuthCode, EmailAuthCodeChoice
+from apps.account.cache import get_token_session, invalidate_account_token, refresh_token_expired
+from apps.account.models import Account, AccountEmailAuthCode, AccountSession, EmailAuthCodeChoice
 from django.utils import timezone
 from datetime import timedelta
 
@@ -84,8 +90,10 @@ class AccountTestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         # 检查响应数据是否为生成的 token
         token = response.json()['data']['token']
-        user_state = Account.objects.filter(username=self.user.username).first()
-        self.assertEqual(token, user_state.access_token)
+        session = AccountSession.objects.get(account=self.user)
+        # 数据库中只保存token的摘要
+        self.assertEqual(AccountSession.hash_token(token), session.token_hash)
+        self.assertNotEqual(token, session.token_hash)
 
     def test_login_fail(self):
         # 模拟发送请求（错误的密码）
@@ -98,3 +106,126 @@ class AccountTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         # 检查响应数据
         self.assertEqual(response.json()['errorType'][0], 20102)
+
+
+class AuthenticationCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = Account.objects.create(username='admin', department='IT', email='admin@ecadi.com', can_admin=True, is_super=True,
+                                            password_hash=Account.make_password('admin'))
+        self.user = Account.objects.create(username='user', department='IT', email='user@ecadi.com',
+                                           password_hash=Account.make_password('user'))
+        self.admin_session, self.admin_token = AccountSession.issue(self.admin)
+        self.user_session, self.user_token = AccountSession.issue(self.user)
+
+    def test_token_cached_and_expiry_written_behind(self):
+        headers = {'X-Token': self.user_token}
+        self.client.get(reverse('userinfo'), headers=headers)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('userinfo'), headers=headers)
+        self.assertEqual(response.json()['data']['username'], self.user.username)
+        self.assertEqual(0, len(context.captured_queries))
+        # 过期时间落后超过阈值时只更新 expired 字段
+        AccountSession.objects.filter(id=self.user_session.id).update(expired=timezone.now() + timedelta(seconds=60))
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_account_token(self.user)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('userinfo'), headers=headers)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(1, len(updates))
+        self.assertNotIn('token_hash', updates[0])
+        self.user_session.refresh_from_db()
+        self.assertGreater(self.user_session.expired, timezone.now() + timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME - 60))
+
+    def test_refresh_does_not_recache_revoked_session(self):
+        # 请求读取会话之后，其他请求提交了吊销
+        session = AccountSession.objects.select_related('account').get(id=self.user_session.id)
+        session.expired = timezone.now() + timedelta(seconds=60)
+        AccountSession.revoke([self.user.id])
+        refresh_token_expired(session)
+        self.assertIsNone(get_token_session(session.token_hash))
+        self.assertEqual(401, self.client.get(reverse('userinfo'), headers={'X-Token': self.user_token}).status_code)
+
+    def test_token_cache_invalidated_on_suspend(self):
+        headers = {'X-Token': self.user_token}
+        self.assertEqual(201, self.client.get(reverse('userinfo'), headers=headers).status_code)
+        # 会话缓存在事务提交后清除
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.patch(reverse('suspend_account'), {'id_ban': self.user.id, 'username_ban': self.user.username},
+                              headers={'X-Token': self.admin_token}, content_type='application/json')
+        self.assertEqual(1, len(callbacks))
+        response = self.client.get(reverse('userinfo'), headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class AccountSessionTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = Account.objects.create(username='admin', department='IT', email='admin@ecadi.com', can_admin=True, is_super=True,
+                                            password_hash=Account.make_password('admin'))
+        self.user = Account.objects.create(username='user', department='IT', email='user@ecadi.com',
+                                           password_hash=Account.make_password('user'))
+        _, self.admin_token = AccountSession.issue(self.admin)
+
+    def login(self, device):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('login'), {'username': 'user', 'password': 'user', 'device': device},
+                                        content_type='application/json')
+        return response.json()['data']['token']
+
+    def userinfo(self, token):
+        return self.client.get(reverse('userinfo'), headers={'X-Token': token}).status_code
+
+    def test_multiple_devices(self):
+        pc, phone = self.login('pc'), self.login('phone')
+        self.assertEqual(201, self.userinfo(pc))
+        self.assertEqual(201, self.userinfo(phone))
+        # 同一设备重新登录只替换该设备的会话
+        pc_again = self.login('pc')
+        self.assertEqual(401, self.userinfo(pc))
+        self.assertEqual(201, self.userinfo(phone))
+        self.assertEqual(2, AccountSession.objects.filter(account=self.user).count())
+        response = self.client.get(reverse('account_sessions'), headers={'X-Token': pc_again})
+        sessions = response.json()['data']
+        self.assertEqual(['pc', 'phone'], [session['device'] for session in sessions])
+        self.assertEqual([True, False], [session['isCurrent'] for session in sessions])
+        # 退出其他设备
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('account_sessions') + '?others=true', headers={'X-Token': pc_again})
+        self.assertEqual(401, self.userinfo(phone))
+        self.assertEqual(201, self.userinfo(pc_again))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('account_sessions'), headers={'X-Token': pc_again})
+        self.assertEqual(401, self.userinfo(pc_again))
+
+    def test_revoked_in_other_worker(self):
+        token = self.login('pc')
+        self.assertEqual(201, self.userinfo(token))
+        # 模拟在其他 worker 中吊销，当前进程的缓存未清除
+        AccountSession.revoke([self.user.id])
+        self.assertEqual(201, self.userinfo(token))
+        response = self.client.delete(reverse('account_sessions'), headers={'X-Token': token})
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(401, self.userinfo(token))
+
+    def test_bulk_revoke_and_purge(self):
+        tokens = [self.login(device) for device in ('pc', 'phone')]
+        for token in tokens:
+            self.assertEqual(201, self.userinfo(token))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('revoke_sessions'), {'ids': [self.user.id]},
+                                         headers={'X-Token': self.admin_token}, content_type='application/json')
+        self.assertEqual(2, response.json()['data']['count'])
+        # 布尔值不作为账户主键，空列表不合法
+        for ids in ([True], [], [1, '2']):
+            response = self.client.patch(reverse('revoke_sessions'), {'ids': ids},
+                                         headers={'X-Token': self.admin_token}, content_type='application/json')
+            self.assertFalse(response.json()['success'], ids)
+        for token in tokens:
+            self.assertEqual(401, self.userinfo(token))
+        _, expired_token = AccountSession.issue(self.user, device='tablet')
+        AccountSession.objects.filter(device='tablet').update(expired=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(401, self.userinfo(expired_token))
+        call_command('account', 'purge', stdout=StringIO())
+        # 只保留管理员未过期的会话
+        self.assertEqual([self.admin.id], list(AccountSession.all_objects.values_list('account_id', flat=True)))
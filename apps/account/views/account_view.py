@@ -1,15 +1,13 @@
-from apps.account.models import Account, EmailAuthCodeChoice, AccountEmailAuthCode, LoginLog
+from apps.account.cache import revoke_account_sessions
+from apps.account.models import Account, AccountSession, EmailAuthCodeChoice, AccountEmailAuthCode, LoginLog
 from libs.boost.parser import Argument, JsonParser
 from libs.boost.http import JsonResponse, HttpStatus
 from const.error import ErrorType
 from django.views.generic import View
-from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q
-from datetime import timedelta
 from django.db import transaction
 from utils.utils import get_client_ip
-import uuid
 import loguru
 
 class ChangePasswordView(View):
@@ -46,10 +44,10 @@ class ChangePasswordView(View):
             ).order_by('-id').first()
         
         if vertify_code and vertify_code.code == form.verify_code:
-            # 修改密码哈希，清空token
+            # 修改密码哈希，吊销所有设备的会话
             account.password_hash = Account.make_password(form.password)
-            account.access_token = None
             account.save()
+            revoke_account_sessions([account.id])
             vertify_code.is_valid = False
             vertify_code.save()
             return JsonResponse(data=self.__CHANGE_SUCCESS__, status_code=HttpStatus.HTTP_201_CREATED)
@@ -131,6 +129,8 @@ class LoginView(View):
         form, error = JsonParser(
             Argument('username', data_type=str, required=True),
             Argument('password', data_type=str, required=True),
+            # 设备标识，同一设备重复登录时替换该设备原有的会话
+            Argument('device', data_type=str, required=False),
         ).parse(request.body)
         
         if error:
@@ -167,20 +167,21 @@ class LoginView(View):
             login_log.save()
             return JsonResponse(error_type=ErrorType.ACCOUNT_DISABLED)
 
-        #如果数据一致则生成生成密钥给用户
-        account.access_token = uuid.uuid4().hex
-        account.token_expired = timezone.now() + timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME)
+        #如果数据一致则生成密钥给用户，同一设备旧的token随之失效，其他设备的会话不受影响
+        device = form.device or login_log.agent
+        revoke_account_sessions([account.id], device=device)
+        _, token = AccountSession.issue(account, device=device, ip=login_log.ip)
         # 修改账户最后一次登录和IP
         account.last_ip = login_log.ip
         account.last_login = timezone.now()
-        account.save()
+        account.save(update_fields=['last_ip', 'last_login', 'last_update'])
         
         # 记录一次用户登录
         login_log.message = self.__LOGIN_SUCCESS__
         login_log.is_success = True
         login_log.save()
 
-        return JsonResponse(data={"token": account.access_token, "username": account.username, "is_admin": account.can_admin }, status_code=HttpStatus.HTTP_201_CREATED)
+        return JsonResponse(data={"token": token, "username": account.username, "is_admin": account.can_admin }, status_code=HttpStatus.HTTP_201_CREATED)
     
 class UserInfoView(View):
     def get(self, request) -> JsonResponse:
@@ -5,7 +5,7 @@ from django.db.models.functions import Coalesce
 from apps.account.models import Account
 from apps.plugin.models import Developer, OperationLog
 from libs.boost.parser import Argument, JsonParser
-from libs.boost.http import JsonResponse, paginate_data
+from libs.boost.http import JsonResponse, paginate_cursor, paginate_data, valid_cursor, valid_page_size
 from utils.decorators import admin_required
 from const.error import ErrorType
 from typing import List
@@ -18,7 +18,9 @@ class AdminGetAllAccounts(View):
     def get(self, request:HttpRequest):
         param, error = JsonParser(
             Argument('current', data_type=int, required=False),
-            Argument('page_size', data_type=int, required=False),
+            Argument('page_size', data_type=int, required=False, help='每页数量不合法', filter_func=valid_page_size),
+            Argument('cursor', data_type=str, required=False, help='分页游标不合法', filter_func=valid_cursor(Account, '-id')),
+            Argument('with_count', data_type=bool, required=False),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
@@ -35,20 +37,27 @@ class AdminGetAllAccounts(View):
         for pv in plugin_versions:
             account_plugin_version_dict[pv.created_user.id]+=1
 
-        page_data = paginate_data(accounts, 
-                                  current=param.current if param.current != None else 1, 
-                                  page_size=param.page_size if param.page_size != None else 10, 
-                                  item_handler=lambda account:
-                                  {
-                                    'id':account.id, 
-                                    'username':account.username, 
-                                    'fullname':account.fullname, 
-                                    'email': account.email, 
-                                    'can_admin':account.can_admin,
-                                    'is_super':account.is_super,
-                                    'is_active':account.is_active,
-                                    'app_use_count': account_operation_counts.get(account.id, 0),
-                                    'app_publish_count': account_plugin_version_dict.get(account.id, 0),
-                                    'last_login':account.last_login,
-                                  } )
+        item_handler = lambda account: {
+            'id':account.id, 
+            'username':account.username, 
+            'fullname':account.fullname, 
+            'email': account.email, 
+            'can_admin':account.can_admin,
+            'is_super':account.is_super,
+            'is_active':account.is_active,
+            'app_use_count': account_operation_counts.get(account.id, 0),
+            'app_publish_count': account_plugin_version_dict.get(account.id, 0),
+            'last_login':account.last_login,
+        }
+        if param.cursor is not None:
+            page_data = paginate_cursor(accounts, param.cursor,
+                                        page_size=param.page_size if param.page_size != None else 10,
+                                        ordering='-id',
+                                        item_handler=item_handler,
+                                        with_count=param.with_count == True)
+        else:
+            page_data = paginate_data(accounts,
+                                      current=param.current if param.current != None else 1,
+                                      page_size=param.page_size if param.page_size != None else 10,
+                                      item_handler=item_handler)
         return JsonResponse(page_data)
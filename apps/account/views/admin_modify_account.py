@@ -1,5 +1,6 @@
 from django.views.generic import View
 from django.http import HttpRequest
+from apps.account.cache import invalidate_account_token, revoke_account_sessions
 from apps.account.models import Account
 from libs.boost.parser import Argument, JsonParser
 from libs.boost.http import JsonResponse, HttpStatus
@@ -58,6 +59,7 @@ class AdminModifyAccount(View):
             account.can_admin = form.is_admin
         
         account.save()
+        invalidate_account_token(account)
         return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
 
 
@@ -92,6 +94,6 @@ class AdminChangeAccountPassword(View):
             return JsonResponse(error_type=ErrorType.ACCOUNT_NOT_EXIST)
         
         account.password_hash = Account.make_password(form.password)
-        account.access_token = None
         account.save()
+        revoke_account_sessions([account.id])
         return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
\ No newline at end of file
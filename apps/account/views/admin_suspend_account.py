@@ -1,5 +1,6 @@
 from django.views.generic import View
 from django.http import HttpRequest
+from apps.account.cache import invalidate_account_token, revoke_account_sessions
 from apps.account.models import Account
 from libs.boost.parser import Argument, JsonParser
 from libs.boost.http import JsonResponse, HttpStatus
@@ -45,6 +46,7 @@ class AdminSuspendAccount(View):
 
         account_ban.is_active = False
         account_ban.save()
+        invalidate_account_token(account_ban)
         return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
 
 
@@ -85,6 +87,7 @@ class AdminDeleteAccount(View):
             
         account_del.deleted_at = timezone.now()
         account_del.save()
+        revoke_account_sessions([account_del.id])
         return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
     
 
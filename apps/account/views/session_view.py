@@ -0,0 +1,75 @@
+from django.views.generic import View
+from django.http import HttpRequest
+from django.utils import timezone
+from apps.account.cache import revoke_account_sessions
+from apps.account.models import AccountSession
+from libs.boost.parser import Argument, JsonParser
+from libs.boost.http import JsonResponse, HttpStatus
+from utils.decorators import admin_required
+from const.error import ErrorType
+
+
+class AccountSessionView(View):
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        """
+        当前账户已登录的设备列表
+        """
+        sessions = AccountSession.objects.filter(account_id=request.account.id, expired__gte=timezone.now()) \
+            .values('id', 'device', 'ip', 'created_at', 'expired')
+        data = [{**session, 'is_current': session['id'] == request.account_session.id} for session in sessions]
+        return JsonResponse(data=data)
+
+    def delete(self, request: HttpRequest) -> JsonResponse:
+        """
+        退出登录
+
+        Args:
+            request (HttpRequest): 请求
+            id: 会话主键，不必须，未传入时退出当前设备
+            others: 是否退出当前设备以外的所有设备，不必须
+        Returns:
+            JsonResponse: 返回吊销的会话数量
+        Note:
+            会话缓存为进程内缓存，被吊销的token在其他 worker 的只读请求中最多延迟 AUTHENTICATION_CACHE_TIMEOUT 秒失效
+        """
+        form, error = JsonParser(
+            Argument('id', data_type=int, required=False),
+            Argument('others', data_type=bool, required=False),
+        ).parse(request.GET)
+
+        if error:
+            return JsonResponse(error_type=ErrorType.REQUEST_ILLEGAL)
+
+        current = request.account_session
+        if form.others:
+            count = revoke_account_sessions([request.account.id], excludes=[current.id])
+        else:
+            count = revoke_account_sessions([request.account.id], ids=[form.id if form.id is not None else current.id])
+        return JsonResponse(data={'count': count}, status_code=HttpStatus.HTTP_200_OK)
+
+
+class AdminRevokeAccountSessions(View):
+
+    @admin_required
+    def patch(self, request: HttpRequest) -> JsonResponse:
+        """
+        批量吊销账户所有设备的会话，账户需重新登录
+        需要管理员权限
+        Args:
+            request (HttpRequest):
+            ids: 账户主键列表，必须，不能为空
+        Returns:
+            JsonResponse: 返回吊销的会话数量
+        Note:
+            会话缓存为进程内缓存，被吊销的token在其他 worker 的只读请求中最多延迟 AUTHENTICATION_CACHE_TIMEOUT 秒失效
+        """
+        form, error = JsonParser(
+            Argument('ids', data_type=list, required=True, filter_func=lambda ids: len(ids) > 0 and all(type(i) is int for i in ids)),
+        ).parse(request.body)
+
+        if error:
+            return JsonResponse(error_type=ErrorType.REQUEST_ILLEGAL)
+
+        count = revoke_account_sessions(form.ids)
+        return JsonResponse(data={'count': count}, status_code=HttpStatus.HTTP_200_OK)
@@ -15,6 +15,12 @@ class ClientVersion(ModelMixin):
     sha512_hash = models.CharField(max_length=128, default='')
     size = models.BigIntegerField(default=0)
 
+    @staticmethod
+    def get_revision() -> str:
+        """客户端版本信息的版本号，版本记录新增、修改或删除后随之变化"""
+        stat = ClientVersion.all_objects.aggregate(count=models.Count('id'), last_update=models.Max('last_update'))
+        return f"{stat['count']}-{stat['last_update'].timestamp() if stat['last_update'] else 0}"
+
     class Meta:
         db_table = 'client'
         ordering = ('-id',)
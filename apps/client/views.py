@@ -2,7 +2,7 @@ from django.views import View
 from django.http import HttpRequest, HttpResponse
 from libs.boost.parser import Argument, JsonParser
 from libs.boost.http import HttpStatus
-from libs.boost.http import JsonResponse 
+from libs.boost.http import JsonResponse, etag_matches, make_etag, not_modified
 from .models import ClientVersion
 from const.error import ErrorType
 import re
@@ -17,6 +17,10 @@ class DesktopClientVersionView(View):
         ).parse(request.GET)
         if error:
             return JsonResponse(error_type=ErrorType.REQUEST_ILLEGAL, status_code=HttpStatus.HTTP_400_BAD_REQUEST.value)
+        # 客户端轮询时版本信息未变化直接返回304
+        etag = make_etag('client', ClientVersion.get_revision(), form.current_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         client_info = ClientVersion.objects.filter(version_str=form.current_version).first()
         if not client_info:
             return JsonResponse(error_type=ErrorType.OBJECT_NOT_FOUND, status_code=HttpStatus.HTTP_404_NOT_FOUND.value)
@@ -31,7 +35,7 @@ class DesktopClientVersionView(View):
             "description": self.split_numbered_string(latest_info.description),
             "force_update": not client_info.is_active,
         }
-        return JsonResponse(data=update_info)
+        return JsonResponse(data=update_info, etag=etag)
     
     def split_numbered_string(self, text):
         """
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import uuid
+from functools import wraps
+from typing import Callable
+from django.conf import settings
+from django.core.cache import cache
+from apps.plugin.models import CatalogRevision
+from libs.boost.compression import PrecompressedResponse, compress, negotiate_encoding
+from libs.boost.http import JsonResponse
+
+
+def get_catalog_revision(name: str = CatalogRevision.NAME_CATALOG) -> str:
+    """获取目录当前版本号
+
+    版本号保存在数据库中，保证多个 worker 进程看到的版本号一致
+
+    Args:
+        name (str, optional): 版本号名称. Defaults to CatalogRevision.NAME_CATALOG.
+
+    Returns:
+        str: 当前版本号，尚未发生过写操作时为空字符串
+    """
+    revision = CatalogRevision.objects.filter(name=name).values_list('revision', flat=True).first()
+    return revision or ''
+
+
+def bump_catalog_revision(name: str = CatalogRevision.NAME_CATALOG) -> str:
+    """重新生成目录版本号，旧版本号下的缓存随之失效
+
+    使用随机值而非自增数字，避免事务回滚或数据恢复后复用旧版本号读到过期缓存
+    """
+    revision = uuid.uuid4().hex
+    CatalogRevision.objects.update_or_create(name=name, defaults={'revision': revision})
+    return revision
+
+
+def catalog_cache_key(scope: str, revision: str, **params) -> str:
+    """根据接口名称、目录版本号及规范化后的查询参数生成缓存key"""
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f'plugin:{scope}:{revision}:{digest}'
+
+
+def get_catalog_cache(key: str):
+    return cache.get(key)
+
+
+def set_catalog_cache(key: str, value):
+    cache.set(key, value, settings.CATALOG_CACHE_TIMEOUT)
+
+
+def catalog_response(request, cache_key: str, etag: str, build: Callable):
+    """返回目录接口响应
+
+    数据按 cache_key 缓存。客户端支持压缩时，压缩后的响应体与数据缓存在同一版本号下，
+    每个版本号只压缩一次。数据需完整生成后写入缓存，因此不使用流式响应。
+
+    Args:
+        request (HttpRequest): 当前请求
+        cache_key (str): 数据缓存key
+        etag (str): 响应ETag
+        build (Callable): 缓存未命中时生成数据的函数，返回 (result, error)
+    """
+    encoding = negotiate_encoding(request)
+    if encoding is not None:
+        content = get_catalog_cache(f'{cache_key}:{encoding}')
+        if content is not None:
+            return PrecompressedResponse(content, encoding, etag=etag)
+    result = get_catalog_cache(cache_key)
+    if result is None:
+        result, error = build()
+        if error:
+            return JsonResponse(error_message=error)
+        set_catalog_cache(cache_key, result)
+    if encoding is not None:
+        content = compress(JsonResponse(result).content, encoding, best=True)
+        set_catalog_cache(f'{cache_key}:{encoding}', content)
+        return PrecompressedResponse(content, encoding, etag=etag)
+    return JsonResponse(result, etag=etag)
+
+
+def catalog_write(f):
+    """
+    目录写操作装饰器。
+
+    被装饰的视图返回成功响应后更新目录版本号，使目录缓存失效。
+    """
+    @wraps(f)
+    def wrapper(cls, request, *args, **kwargs):
+        response = f(cls, request, *args, **kwargs)
+        if getattr(response, 'success', False):
+            bump_catalog_revision()
+        return response
+    return wrapper
@@ -0,0 +1,142 @@
+from libs.boost.serializer import Field, Serializer
+from apps.plugin.models import Developer, OperationLog, Plugin, PluginCategory, PluginVersion
+
+
+# 插件详情
+class PluginDTO(Serializer):
+    model = Plugin
+    id = Field()
+    name = Field()
+    icon_url = Field()
+    type = Field()
+    link = Field()
+    is_external = Field()
+    description = Field()
+    user_manual = Field()
+    tags = Field('tags.text')
+    category_ids = Field('categories.id')
+
+
+# 插件分类
+class CategoryDTO(Serializer):
+    model = PluginCategory
+    id = Field()
+    name = Field()
+    parent_name = Field('parent.name')
+
+
+# 管理后台插件列表，version_count 由查询集 annotate 提供
+class PluginListDTO(Serializer):
+    model = Plugin
+    id = Field()
+    icon_url = Field()
+    name = Field()
+    description = Field()
+    categories = Field(serializer=CategoryDTO)
+    type = Field()
+    is_external = Field()
+    link = Field()
+    version_count = Field()
+    use_count = Field()
+    user_manual = Field()
+
+
+# 插件目录，插件及其最新版本
+class PluginCatalogDTO(Serializer):
+    model = Plugin
+    id = Field()
+    version_id = Field('latest_version.id')
+    version_no = Field('latest_version.version_no')
+    name = Field()
+    icon_url = Field()
+    attachment_url = Field('latest_version.attachment_url')
+    attachment_size = Field('latest_version.attachment_size')
+    execution_file_path = Field('latest_version.execution_file_path')
+    type = Field()
+    link = Field()
+    tags = Field('tags.text')
+
+
+# 插件目录，按指定的插件版本返回，字段与 PluginCatalogDTO 一致
+class VersionCatalogDTO(Serializer):
+    model = PluginVersion
+    id = Field('plugin.id')
+    version_id = Field('id')
+    version_no = Field()
+    name = Field('plugin.name')
+    icon_url = Field('plugin.icon_url')
+    attachment_url = Field()
+    attachment_size = Field()
+    execution_file_path = Field()
+    type = Field('plugin.type')
+    link = Field('plugin.link')
+    tags = Field('plugin.tags.text')
+
+
+# 开发者信息
+class DeveloperDTO(Serializer):
+    model = Developer
+    id = Field()
+    name = Field()
+    email = Field()
+    phone = Field()
+
+
+# 管理后台插件版本列表
+class PluginVersionListDTO(Serializer):
+    model = PluginVersion
+    id = Field()
+    plugin_id = Field('plugin.id')
+    plugin_name = Field('plugin.name')
+    version_no = Field()
+    description = Field()
+    publish_date = Field()
+    developers = Field('authors', serializer=DeveloperDTO)
+    use_count = Field()
+
+
+class VersionBriefDTO(Serializer):
+    model = PluginVersion
+    id = Field()
+    version_no = Field()
+
+
+class AuthorDTO(Serializer):
+    model = Developer
+    name = Field()
+    phone = Field()
+    email = Field()
+
+
+# 插件版本详情
+class PluginVersionDetailDTO(Serializer):
+    model = PluginVersion
+    id = Field()
+    plugin_id = Field('plugin.id')
+    user_manual = Field('plugin.user_manual')
+    icon_url = Field('plugin.icon_url')
+    plugin_type = Field('plugin.type')
+    version_no = Field()
+    versions = Field('plugin.versions', serializer=VersionBriefDTO)
+    name = Field('plugin.name')
+    is_external = Field('plugin.is_external')
+    description = Field('plugin.description')
+    update_description = Field('description')
+    link = Field('plugin.link')
+    attachment_url = Field()
+    attachment_size = Field()
+    execution_file_path = Field()
+    publish_date = Field()
+    tags = Field('plugin.tags.text')
+    authors = Field(serializer=AuthorDTO)
+
+
+# 插件版本操作记录
+class OperationLogDTO(Serializer):
+    model = OperationLog
+    id = Field()
+    plugin_name = Field('version.plugin.name')
+    version_no = Field('version.version_no')
+    type = Field()
+    occurred_at = Field()
+    created_at = Field()
@@ -0,0 +1,151 @@
+"""操作记录批量写入
+
+打开、安装等操作记录是写入量最大的接口，每个 worker 进程在内存中缓冲操作记录，
+达到 OPERATION_LOG_BUFFER_SIZE 条或距上次写入超过 OPERATION_LOG_FLUSH_INTERVAL 秒时
+通过 bulk_create 批量写入，并按版本合并累加使用次数。
+
+版本ID通过进程内缓存的 {版本ID: 插件ID} 校验，目录版本号变化时重新加载。
+gunicorn 的 post_worker_init 中启动定时写入线程，worker_exit 中写入剩余记录。
+
+示例:
+    from apps.plugin.ingest import operation_log_buffer
+
+    operation_log_buffer.add(version_id, OperationLog.TYPE_OPEN, account.id)
+    operation_log_buffer.flush()
+"""
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+import loguru
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from apps.plugin.cache import get_catalog_revision
+from apps.plugin.models import OperationLog, PluginVersion
+
+# 写入失败时保留的记录数量上限（缓冲区大小的倍数），超出部分丢弃
+MAX_PENDING_FACTOR = 10
+
+
+class VersionSet:
+    """进程内缓存的可用版本，用于校验操作记录的版本ID"""
+
+    def __init__(self):
+        self._versions: Dict[int, int] = {}
+        self._revision: str | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_plugin_id(self, version_id: int) -> int | None:
+        """返回版本所属插件ID，版本不存在或已删除时返回None"""
+        self._check_revision()
+        plugin_id = self._versions.get(version_id)
+        if plugin_id is None:
+            # 目录版本号检查间隔内新发布的版本，单独查询后加入缓存
+            plugin_id = PluginVersion.objects.filter(id=version_id).values_list('plugin_id', flat=True).first()
+            if plugin_id is not None:
+                self._versions[version_id] = plugin_id
+        return plugin_id
+
+    def _check_revision(self):
+        """每隔 OPERATION_LOG_FLUSH_INTERVAL 秒检查一次目录版本号，发生变化时重新加载"""
+        now = time.monotonic()
+        if self._revision is not None and now - self._checked_at < settings.OPERATION_LOG_FLUSH_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            revision = get_catalog_revision()
+            if revision != self._revision:
+                self._versions = dict(PluginVersion.objects.values_list('id', 'plugin_id'))
+                self._revision = revision
+
+    def clear(self):
+        with self._lock:
+            self._versions = {}
+            self._revision = None
+
+
+class OperationLogBuffer:
+    """操作记录缓冲区，每个 worker 进程一个实例"""
+
+    def __init__(self):
+        self.versions = VersionSet()
+        # (操作记录, 插件ID)
+        self._pending: List[Tuple[OperationLog, int]] = []
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, version_id: int, type: int, user_id: int) -> bool:
+        """缓冲一条操作记录，版本不存在时返回False
+
+        缓冲数量或间隔达到阈值时在当前请求中写入
+        """
+        plugin_id = self.versions.get_plugin_id(version_id)
+        if plugin_id is None:
+            return False
+        with self._lock:
+            self._pending.append((OperationLog(version_id=version_id, type=type, created_user_id=user_id), plugin_id))
+            should_flush = len(self._pending) >= settings.OPERATION_LOG_BUFFER_SIZE \
+                or time.monotonic() - self._flushed_at >= settings.OPERATION_LOG_FLUSH_INTERVAL
+        if should_flush:
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        """写入缓冲的操作记录并累加使用次数，返回写入数量
+
+        写入失败时记录放回缓冲区等待下次写入
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        # 同一版本的使用次数合并为一次累加
+        counts = Counter((log.version_id, plugin_id) for log, plugin_id in pending)
+        try:
+            with transaction.atomic():
+                OperationLog.objects.bulk_create([log for log, _ in pending], batch_size=settings.OPERATION_LOG_BUFFER_SIZE)
+                for (version_id, plugin_id), count in counts.items():
+                    PluginVersion.increase_use_count(version_id, plugin_id, count)
+        except DatabaseError as e:
+            loguru.logger.error(f"操作记录写入失败: {e}")
+            self._restore(pending)
+            return 0
+        return len(pending)
+
+    def _restore(self, pending: List[Tuple[OperationLog, int]]):
+        limit = settings.OPERATION_LOG_BUFFER_SIZE * MAX_PENDING_FACTOR
+        with self._lock:
+            self._pending = pending + self._pending
+            if len(self._pending) > limit:
+                loguru.logger.error(f"操作记录缓冲区超出上限，丢弃最早的{len(self._pending) - limit}条记录")
+                self._pending = self._pending[-limit:]
+
+    def start(self):
+        """启动定时写入线程，在 gunicorn worker 初始化完成后调用"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='operation-log-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> int:
+        """停止定时写入线程并写入剩余记录，在 gunicorn worker 退出时调用"""
+        self._stopped.set()
+        self._thread = None
+        return self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(settings.OPERATION_LOG_FLUSH_INTERVAL):
+            if time.monotonic() - self._flushed_at >= settings.OPERATION_LOG_FLUSH_INTERVAL:
+                self.flush()
+            close_old_connections()
+
+
+operation_log_buffer = OperationLogBuffer()
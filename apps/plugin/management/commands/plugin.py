@@ -0,0 +1,113 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from apps.plugin import partitions
+from apps.plugin.models import OperationLog, OperationLogDaily, Plugin, PluginUsageRollup, PluginVersion, RollupCheckpoint, VersionUsageRollup
+
+# 由操作记录生成的汇总表
+ROLLUPS = (OperationLogDaily, PluginUsageRollup, VersionUsageRollup)
+
+
+def date_ranges(days) -> list[tuple[datetime.date, datetime.date]]:
+    """将日期合并为连续的 [start, end) 区间"""
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1] = (ranges[-1][0], day + datetime.timedelta(days=1))
+        else:
+            ranges.append((day, day + datetime.timedelta(days=1)))
+    return ranges
+
+
+class Command(BaseCommand):
+    help = '插件数据维护'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', type=str, help='执行动作')
+        parser.add_argument('--days', type=int, default=2, help='汇总最近几天的操作记录（默认2天，含当天）')
+        parser.add_argument('--drop', default=False, action='store_true', help='分离分区后删除分离出的表（默认保留）')
+        parser.add_argument('--start', type=parse_date, default=None, help='回填开始日期，格式 YYYY-MM-DD（默认最早的操作记录）')
+        parser.add_argument('--end', type=parse_date, default=None, help='回填结束日期（含），格式 YYYY-MM-DD（默认当天）')
+
+    def echo_success(self, msg):
+        self.stdout.write(self.style.SUCCESS(msg))
+
+    def echo_error(self, msg):
+        self.stderr.write(self.style.ERROR(msg))
+
+    def rollup(self, start: datetime.date, end: datetime.date) -> int:
+        """重新生成 [start, end) 日期内的所有汇总数据，不覆盖开始于已分离分区中的日期及周"""
+        since = partitions.first_partition()
+        return sum(model.rollup(start, end, since=since) for model in ROLLUPS)
+
+    def print_help(self, *args):
+        message = '''
+        插件数据维护命令用法：
+            plugin latest  重新计算所有插件的最新版本，例如：plugin latest
+            plugin search  重新生成所有插件的搜索文档，例如：plugin search
+            plugin counter 根据操作记录重新计算使用次数，例如：plugin counter
+            plugin rollup  汇总最近几天及上次执行以来补报的操作记录，建议每天执行，例如：plugin rollup --days 2
+            plugin backfill 按月重新汇总指定日期内的操作记录，例如：plugin backfill --start 2024-01-01 --end 2024-12-31
+            plugin partition 创建之后几个月的操作记录分区，建议每天执行，例如：plugin partition
+            plugin detach  汇总并分离超出保留期的操作记录分区，例如：plugin detach --drop
+        '''
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'latest':
+            latest = PluginVersion.objects.filter(plugin_id=OuterRef('id')).order_by('-id').values('id')[:1]
+            count = Plugin.objects.update(latest_version_id=Subquery(latest))
+            self.echo_success(f'已更新{count}个插件的最新版本')
+        elif action == 'search':
+            plugins = Plugin.objects.all()
+            for plugin in plugins:
+                plugin.refresh_search_document()
+            self.echo_success(f'已更新{len(plugins)}个插件的搜索文档')
+        elif action == 'counter':
+            # 已分离分区的月份没有原始数据，从按天汇总读取
+            PluginVersion.reconcile_use_count(since=partitions.first_partition())
+            self.echo_success('使用次数已重新计算')
+        elif action == 'rollup':
+            # 除最近几天外，同时重新汇总上次执行以来补报的操作记录所在的日期
+            today = timezone.localdate()
+            checkpoint = RollupCheckpoint.load()
+            late_days, log_id = checkpoint.pending_days()
+            days = {today - datetime.timedelta(days=index) for index in range(options['days'])}
+            late_days -= days
+            count = sum(self.rollup(start, end) for start, end in date_ranges(days | late_days))
+            checkpoint.log_id = log_id
+            checkpoint.save()
+            self.echo_success(f'已汇总{count}条统计，其中补报日期{len(late_days)}天')
+        elif action == 'backfill':
+            # 只能回填原始分区仍挂载的日期，已分离的日期没有原始数据
+            first = OperationLog.objects.aggregate(first=Min('occurred_at'))['first']
+            start = options['start'] or (timezone.localdate(first) if first else timezone.localdate())
+            end = (options['end'] or timezone.localdate()) + datetime.timedelta(days=1)
+            count, month = 0, partitions.month_start(start)
+            while month < end:
+                count += self.rollup(max(month, start), min(partitions.add_months(month, 1), end))
+                month = partitions.add_months(month, 1)
+            self.echo_success(f'已回填{start}至{end - datetime.timedelta(days=1)}的{count}条统计')
+        elif action == 'partition':
+            if not partitions.is_partitioned():
+                return self.echo_error('操作记录表不是分区表')
+            created = partitions.ensure_partitions(settings.OPERATION_LOG_PARTITION_AHEAD)
+            self.echo_success(f'已创建{len(created)}个分区 {" ".join(created)}')
+        elif action == 'detach':
+            if not partitions.is_partitioned():
+                return self.echo_error('操作记录表不是分区表')
+            boundary = partitions.retention_start()
+            for month in partitions.list_partitions():
+                if month >= boundary:
+                    break
+                # 分离前重新汇总整月，保证汇总数据完整
+                self.rollup(month, partitions.add_months(month, 1))
+                partitions.detach_partition(month, drop=options['drop'])
+                self.echo_success(f'已分离分区 {partitions.partition_name(month)}')
+        else:
+            self.echo_error('未识别的操作')
+            self.print_help()
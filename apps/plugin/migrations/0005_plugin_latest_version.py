@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 09:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_latest_version(apps, schema_editor):
+    Plugin = apps.get_model('plugin', 'Plugin')
+    PluginVersion = apps.get_model('plugin', 'PluginVersion')
+    latest = PluginVersion.objects.filter(plugin_id=models.OuterRef('id'), deleted_at__isnull=True).order_by('-id').values('id')[:1]
+    Plugin.objects.update(latest_version_id=models.Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0004_plugin_user_manual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugin',
+            name='latest_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='plugin.pluginversion', verbose_name='最新版本'),
+        ),
+        migrations.RunPython(backfill_latest_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 09:07
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import DatabaseError, migrations, models, transaction
+
+SEARCH_CONFIG = 'simple'
+
+
+def backfill_search_document(apps, schema_editor):
+    Plugin = apps.get_model('plugin', 'Plugin')
+    PluginVersion = apps.get_model('plugin', 'PluginVersion')
+    for plugin in Plugin.objects.filter(deleted_at__isnull=True):
+        tags = ' '.join(plugin.tags.values_list('text', flat=True))
+        descriptions = ' '.join(PluginVersion.objects.filter(plugin_id=plugin.id, deleted_at__isnull=True).values_list('description', flat=True))
+        Plugin.objects.filter(id=plugin.id).update(
+            search_document=' '.join([plugin.name, plugin.description or '', tags, descriptions]).lower(),
+            search_vector=SearchVector(models.Value(plugin.name), weight='A', config=SEARCH_CONFIG)
+                + SearchVector(models.Value(tags), weight='A', config=SEARCH_CONFIG)
+                + SearchVector(models.Value(plugin.description or ''), weight='B', config=SEARCH_CONFIG)
+                + SearchVector(models.Value(descriptions), weight='C', config=SEARCH_CONFIG),
+        )
+
+
+def create_trigram_index(apps, schema_editor):
+    # 数据库未提供 pg_trgm 扩展或迁移账户无权创建扩展时跳过，包含查询仍然正确，只是无法走三元组索引
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                return
+            # 在保存点中创建，失败时只回滚到保存点，不中断整个迁移
+            try:
+                with transaction.atomic(using=schema_editor.connection.alias):
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            except DatabaseError:
+                return
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS plugin_search_document_trgm ON plugin USING gin (search_document gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS plugin_search_document_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0006_catalogrevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugin',
+            name='search_document',
+            field=models.TextField(default='', editable=False, verbose_name='搜索文档'),
+        ),
+        migrations.AddField(
+            model_name='plugin',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='plugin',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='plugin_search_vector_gin'),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 09:14
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_use_count(apps, schema_editor):
+    Plugin = apps.get_model('plugin', 'Plugin')
+    PluginVersion = apps.get_model('plugin', 'PluginVersion')
+    OperationLog = apps.get_model('plugin', 'OperationLog')
+    log_count = OperationLog.objects.filter(version_id=models.OuterRef('id')).values('version_id').annotate(count=models.Count('id')).values('count')
+    PluginVersion.objects.update(use_count=Coalesce(models.Subquery(log_count), 0))
+    version_sum = PluginVersion.objects.filter(plugin_id=models.OuterRef('id')).values('plugin_id').annotate(count=models.Sum('use_count')).values('count')
+    Plugin.objects.update(use_count=Coalesce(models.Subquery(version_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0007_plugin_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugin',
+            name='use_count',
+            field=models.BigIntegerField(default=0, verbose_name='使用次数'),
+        ),
+        migrations.AddField(
+            model_name='pluginversion',
+            name='use_count',
+            field=models.BigIntegerField(default=0, verbose_name='使用次数'),
+        ),
+        migrations.RunPython(backfill_use_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 09:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_occurred_at(apps, schema_editor):
+    OperationLog = apps.get_model('plugin', 'OperationLog')
+    OperationLog.objects.update(occurred_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0008_use_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operationlog',
+            name='occurred_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='发生时间'),
+        ),
+        migrations.RunPython(backfill_occurred_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2 on 2026-10-18 09:38
+
+import datetime
+import zoneinfo
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLE = 'plugin_operation_log'
+LEGACY_TABLE = 'plugin_operation_log_legacy'
+# 迁移时预先创建的月份数
+PARTITION_AHEAD = 3
+
+
+def month_bound(year: int, month: int) -> str:
+    return datetime.datetime(year, month, 1, tzinfo=zoneinfo.ZoneInfo(settings.TIME_ZONE)).isoformat()
+
+
+def partition_operation_log(apps, schema_editor):
+    """将操作记录表转换为按 occurred_at 每月分区的分区表
+
+    分区表的主键需包含分区键，主键改为 (id, occurred_at)；原有索引和外键以相同名称重建
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s', [TABLE, f'{TABLE}_pkey'])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [TABLE])
+        foreign_keys = cursor.fetchall()
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT min(occurred_at) FROM {TABLE}')
+        first = cursor.fetchone()[0]
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+    schema_editor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {LEGACY_TABLE}_id_seq')
+    schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY RANGE (occurred_at)')
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    tz = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    now = datetime.datetime.now(tz)
+    start = first.astimezone(tz) if first else now
+    index, last = start.year * 12 + start.month - 1, now.year * 12 + now.month - 1 + PARTITION_AHEAD
+    while index <= last:
+        year, month = divmod(index, 12)
+        next_year, next_month = divmod(index + 1, 12)
+        schema_editor.execute(f"CREATE TABLE {TABLE}_p{year:04d}{month + 1:02d} PARTITION OF {TABLE} "
+                              f"FOR VALUES FROM ('{month_bound(year, month + 1)}') TO ('{month_bound(next_year, next_month + 1)}')")
+        index += 1
+    schema_editor.execute(f'INSERT INTO {TABLE} OVERRIDING SYSTEM VALUE SELECT * FROM {LEGACY_TABLE}')
+    schema_editor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(max(id), 0) + 1, false) FROM {TABLE}")
+    schema_editor.execute(f'DROP TABLE {LEGACY_TABLE}')
+    schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, occurred_at)')
+    for indexdef in indexes:
+        schema_editor.execute(indexdef)
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0009_operationlog_occurred_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationLogDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deleted_at', models.DateTimeField(default=None, null=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('type', models.IntegerField(choices=[(1, '打开'), (2, '安装'), (3, '运行')], verbose_name='操作类型')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('count', models.IntegerField(default=0, verbose_name='操作次数')),
+                ('user_count', models.IntegerField(default=0, verbose_name='操作人数')),
+            ],
+            options={
+                'db_table': 'plugin_operation_log_daily',
+                'ordering': ('day',),
+            },
+        ),
+        migrations.RunPython(partition_operation_log, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['version', 'occurred_at'], name='plugin_oplog_version_time_idx'),
+        ),
+        migrations.AddField(
+            model_name='operationlogdaily',
+            name='version',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_logs', to='plugin.pluginversion'),
+        ),
+        migrations.AddIndex(
+            model_name='operationlogdaily',
+            index=models.Index(fields=['day'], name='plugin_oplog_daily_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='operationlogdaily',
+            constraint=models.UniqueConstraint(fields=('version', 'type', 'day'), name='plugin_oplog_daily_unique'),
+        ),
+    ]
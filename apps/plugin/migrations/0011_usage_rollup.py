@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0010_operation_log_partition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deleted_at', models.DateTimeField(default=None, null=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('period', models.CharField(choices=[('day', '按天'), ('week', '按周')], max_length=10, verbose_name='统计周期')),
+                ('start', models.DateField(verbose_name='周期开始日期')),
+                ('opens', models.IntegerField(default=0, verbose_name='打开次数')),
+                ('installs', models.IntegerField(default=0, verbose_name='安装次数')),
+                ('runs', models.IntegerField(default=0, verbose_name='运行次数')),
+                ('users', models.IntegerField(default=0, verbose_name='操作人数')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='plugin.pluginversion', verbose_name='插件版本')),
+            ],
+            options={
+                'db_table': 'plugin_version_usage_rollup',
+                'ordering': ('start',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PluginUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deleted_at', models.DateTimeField(default=None, null=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('period', models.CharField(choices=[('day', '按天'), ('week', '按周')], max_length=10, verbose_name='统计周期')),
+                ('start', models.DateField(verbose_name='周期开始日期')),
+                ('opens', models.IntegerField(default=0, verbose_name='打开次数')),
+                ('installs', models.IntegerField(default=0, verbose_name='安装次数')),
+                ('runs', models.IntegerField(default=0, verbose_name='运行次数')),
+                ('users', models.IntegerField(default=0, verbose_name='操作人数')),
+                ('plugin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='plugin.plugin', verbose_name='插件')),
+            ],
+            options={
+                'db_table': 'plugin_usage_rollup',
+                'ordering': ('start',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='versionusagerollup',
+            constraint=models.UniqueConstraint(fields=('version', 'period', 'start'), name='plugin_version_usage_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='pluginusagerollup',
+            constraint=models.UniqueConstraint(fields=('plugin', 'period', 'start'), name='plugin_usage_rollup_unique'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugin', '0011_usage_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deleted_at', models.DateTimeField(default=None, null=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('log_id', models.BigIntegerField(default=0, verbose_name='操作记录ID')),
+            ],
+            options={
+                'db_table': 'plugin_rollup_checkpoint',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -1,4 +1,9 @@
+import datetime
 from django.db import models
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncWeek
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from apps.account.models import Account
 from django.utils import timezone
 
@@ -61,18 +66,48 @@ class Plugin(ModelAudit):
     user_manual = models.URLField(verbose_name="User Manual Link", null=True)
     tags = models.ManyToManyField(Tag, related_name='tags',db_table='r_plugin_tag')
     categories = models.ManyToManyField(PluginCategory, related_name='plugin_category', db_table='r_plugin_category')
+    # 冗余最新版本，列表查询时通过 select_related 一次取出，避免逐条查询版本表
+    latest_version = models.ForeignKey('PluginVersion', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='最新版本')
+    # 搜索文档，名称、描述、标签及版本更新说明的小写拼接，配合 pg_trgm 索引做包含查询
+    search_document = models.TextField(default='', editable=False, verbose_name='搜索文档')
+    search_vector = SearchVectorField(null=True, editable=False)
+    # 使用次数计数器，包含该插件所有版本（含已删除版本）的操作记录数，写操作记录时累加
+    use_count = models.BigIntegerField(default=0, verbose_name='使用次数')
+
+    # 全文检索配置，simple 不做词干处理，中英文内容均可使用
+    SEARCH_CONFIG = 'simple'
     def __str__(self):
         return self.name
     
+    def refresh_latest_version(self):
+        """根据未删除的版本重新计算最新版本并保存"""
+        self.latest_version = self.versions.order_by('-id').first()
+        self.save(update_fields=['latest_version'])
+
+    def refresh_search_document(self):
+        """根据插件信息、标签及未删除的版本更新说明重新生成搜索文档"""
+        tags = ' '.join(self.tags.values_list('text', flat=True))
+        descriptions = ' '.join(self.versions.values_list('description', flat=True))
+        self.search_document = ' '.join([self.name, self.description or '', tags, descriptions]).lower()
+        Plugin.objects.filter(id=self.id).update(
+            search_document=self.search_document,
+            search_vector=SearchVector(Value(self.name), weight='A', config=self.SEARCH_CONFIG)
+                + SearchVector(Value(tags), weight='A', config=self.SEARCH_CONFIG)
+                + SearchVector(Value(self.description or ''), weight='B', config=self.SEARCH_CONFIG)
+                + SearchVector(Value(descriptions), weight='C', config=self.SEARCH_CONFIG),
+        )
+
     def to_dto(self):
-        dto = self.to_dict(selects=['id','name','icon_url','type','link','is_external','description', 'user_manual'])
-        dto['tags'] = [item.text for item in self.tags.all()]
-        dto['categoryIds'] = [item.id for item in self.categories.all()]
-        return dto
+        # dto 模块依赖本模块中的模型，在此处导入避免循环引用
+        from apps.plugin.dto import PluginDTO
+        return PluginDTO.serialize(self)
     
     class Meta:
         db_table = 'plugin'
         ordering = ('id',)
+        indexes = [
+            GinIndex(fields=['search_vector'], name='plugin_search_vector_gin'),
+        ]
     
     
 # 插件版本信息
@@ -99,8 +134,35 @@ class PluginVersion(ModelAudit):
     authors = models.ManyToManyField(Developer, db_table='r_plugin_version_developer')
     status = models.IntegerField(choices=STATUSES_CHOICES, default=STATUS_NEW, verbose_name='状态')
     publish_date = models.DateTimeField("发布时间", default=timezone.now)
+    # 使用次数计数器，写操作记录时累加，可通过 plugin counter 命令与操作记录重新对账
+    use_count = models.BigIntegerField(default=0, verbose_name='使用次数')
     def __str__(self):
         return self.plugin.name
+
+    @staticmethod
+    def increase_use_count(version_id: int, plugin_id: int, count: int = 1):
+        """累加版本及所属插件的使用次数"""
+        PluginVersion.all_objects.filter(id=version_id).update(use_count=F('use_count') + count)
+        Plugin.all_objects.filter(id=plugin_id).update(use_count=F('use_count') + count)
+
+    @staticmethod
+    def reconcile_use_count(since: datetime.date = None):
+        """根据操作记录重新计算所有版本及插件的使用次数
+
+        Args:
+            since (datetime.date, optional): 最早挂载的分区月份，之前的原始分区已分离，使用次数从按天汇总读取. Defaults to None.
+        """
+        logs = OperationLog.all_objects.filter(version_id=OuterRef('id'))
+        use_count = Value(0)
+        if since is not None:
+            logs = logs.filter(occurred_at__gte=datetime.datetime.combine(since, datetime.time.min, tzinfo=timezone.get_current_timezone()))
+            daily_count = OperationLogDaily.all_objects.filter(version_id=OuterRef('id'), day__lt=since).values('version_id') \
+                .annotate(count=Sum('count')).values('count')
+            use_count = Coalesce(Subquery(daily_count), 0)
+        log_count = logs.values('version_id').annotate(count=Count('id')).values('count')
+        PluginVersion.all_objects.update(use_count=Coalesce(Subquery(log_count), 0) + use_count)
+        version_sum = PluginVersion.all_objects.filter(plugin_id=OuterRef('id')).values('plugin_id').annotate(count=Sum('use_count')).values('count')
+        Plugin.all_objects.update(use_count=Coalesce(Subquery(version_sum), 0))
     class Meta:
         db_table = 'plugin_version'
         ordering = ('id',)
@@ -118,9 +180,185 @@ class OperationLog(ModelMixin):
     version = models.ForeignKey(PluginVersion, on_delete=models.CASCADE, related_name='logs')
     created_user = models.ForeignKey(Account, on_delete=models.CASCADE, verbose_name='操作者')
     type = models.IntegerField(choices=TYPES_CHOICES, default=TYPE_OPEN, verbose_name='操作类型')
+    # 操作实际发生的时间，离线客户端补报时早于 created_at
+    occurred_at = models.DateTimeField(default=timezone.now, verbose_name='发生时间')
     
     def __str__(self):
         return self.created_user.username + '-' + self.version.plugin.name + '-' + self.version.version_no
     class Meta:
+        # PostgreSQL 中按 occurred_at 每月一个分区，主键为 (id, occurred_at)，分区维护见 apps.plugin.partitions
         db_table = 'plugin_operation_log'
-        ordering = ('id',)
\ No newline at end of file
+        ordering = ('id',)
+        indexes = [
+            models.Index(fields=['version', 'occurred_at'], name='plugin_oplog_version_time_idx'),
+        ]
+
+# 操作记录按天汇总，由 plugin rollup 命令维护，使用统计从该表读取
+class OperationLogDaily(ModelMixin):
+    version = models.ForeignKey(PluginVersion, on_delete=models.CASCADE, related_name='daily_logs')
+    type = models.IntegerField(choices=OperationLog.TYPES_CHOICES, verbose_name='操作类型')
+    day = models.DateField(verbose_name='日期')
+    count = models.IntegerField(default=0, verbose_name='操作次数')
+    user_count = models.IntegerField(default=0, verbose_name='操作人数')
+
+    @staticmethod
+    def rollup(start: datetime.date, end: datetime.date, since: datetime.date = None) -> int:
+        """汇总 [start, end) 日期内的操作记录，已有的汇总行被覆盖，返回汇总行数
+
+        日期按 TIME_ZONE 计算。原始分区分离后再汇总对应日期不会产生数据，已有汇总行保持不变
+
+        Args:
+            since (datetime.date, optional): 最早挂载的分区月份，之前的日期不汇总. Defaults to None.
+        """
+        if since is not None:
+            start = max(start, since)
+        tz = timezone.get_current_timezone()
+        logs = OperationLog.objects.filter(
+            occurred_at__gte=datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+            occurred_at__lt=datetime.datetime.combine(end, datetime.time.min, tzinfo=tz),
+        ).annotate(day=TruncDate('occurred_at')).order_by().values('version_id', 'type', 'day').annotate(
+            count=Count('id'), user_count=Count('created_user_id', distinct=True))
+        rows = [OperationLogDaily(**row) for row in logs]
+        OperationLogDaily.objects.bulk_create(rows, batch_size=1000, update_conflicts=True, unique_fields=['version', 'type', 'day'],
+                                              update_fields=['count', 'user_count', 'last_update'])
+        return len(rows)
+
+    def __str__(self):
+        return f'{self.version_id}-{self.type}-{self.day}'
+    class Meta:
+        db_table = 'plugin_operation_log_daily'
+        ordering = ('day',)
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'type', 'day'], name='plugin_oplog_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='plugin_oplog_daily_day_idx'),
+        ]
+
+# 使用统计汇总，按天及按周（周一开始）统计打开、安装、运行次数及操作人数，由 plugin rollup 命令维护
+class UsageRollup(ModelMixin):
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIODS_CHOICES = [
+        (PERIOD_DAY, '按天'),
+        (PERIOD_WEEK, '按周'),
+    ]
+    # 汇总维度的外键字段名及其在操作记录中的取值路径，由子类指定
+    SCOPE_FIELD = None
+    SCOPE_LOOKUP = None
+    period = models.CharField(max_length=10, choices=PERIODS_CHOICES, verbose_name='统计周期')
+    start = models.DateField(verbose_name='周期开始日期')
+    opens = models.IntegerField(default=0, verbose_name='打开次数')
+    installs = models.IntegerField(default=0, verbose_name='安装次数')
+    runs = models.IntegerField(default=0, verbose_name='运行次数')
+    users = models.IntegerField(default=0, verbose_name='操作人数')
+
+    @staticmethod
+    def period_range(period: str, start: datetime.date, end: datetime.date) -> tuple[datetime.date, datetime.date]:
+        """将 [start, end) 扩展为完整的统计周期"""
+        if period == UsageRollup.PERIOD_WEEK:
+            start = start - datetime.timedelta(days=start.weekday())
+            end = end + datetime.timedelta(days=-end.weekday() % 7)
+        return start, end
+
+    @classmethod
+    def rollup(cls, start: datetime.date, end: datetime.date, since: datetime.date = None) -> int:
+        """汇总 [start, end) 日期内的操作记录，按周汇总时扩展为完整的周，已有的汇总行被覆盖，返回汇总行数
+
+        Args:
+            since (datetime.date, optional): 最早挂载的分区月份，开始于该日期之前的周期原始数据不完整，保留已有的汇总行. Defaults to None.
+        """
+        tz = timezone.get_current_timezone()
+        scope = cls._meta.get_field(cls.SCOPE_FIELD).attname
+        count = 0
+        for period, trunc in ((cls.PERIOD_DAY, TruncDate('occurred_at')),
+                              (cls.PERIOD_WEEK, TruncWeek('occurred_at', output_field=models.DateField()))):
+            period_start, period_end = cls.period_range(period, start, end)
+            if since is not None and period_start < since:
+                # 从 since 及之后第一个完整的周期开始
+                period_start = since if period == cls.PERIOD_DAY else since + datetime.timedelta(days=-since.weekday() % 7)
+            if period_start >= period_end:
+                continue
+            logs = OperationLog.objects.filter(
+                occurred_at__gte=datetime.datetime.combine(period_start, datetime.time.min, tzinfo=tz),
+                occurred_at__lt=datetime.datetime.combine(period_end, datetime.time.min, tzinfo=tz),
+            ).order_by().values(scope_id=F(cls.SCOPE_LOOKUP), start=trunc).annotate(
+                opens=Count('id', filter=models.Q(type=OperationLog.TYPE_OPEN)),
+                installs=Count('id', filter=models.Q(type=OperationLog.TYPE_INSTALL)),
+                runs=Count('id', filter=models.Q(type=OperationLog.TYPE_RUN)),
+                users=Count('created_user_id', distinct=True),
+            )
+            rows = [cls(**{scope: row.pop('scope_id')}, period=period, **row) for row in logs]
+            cls.objects.bulk_create(rows, batch_size=1000, update_conflicts=True, unique_fields=[cls.SCOPE_FIELD, 'period', 'start'],
+                                    update_fields=['opens', 'installs', 'runs', 'users', 'last_update'])
+            count += len(rows)
+        return count
+
+    class Meta:
+        abstract = True
+        ordering = ('start',)
+
+
+class PluginUsageRollup(UsageRollup):
+    SCOPE_FIELD = 'plugin'
+    SCOPE_LOOKUP = 'version__plugin_id'
+    plugin = models.ForeignKey(Plugin, on_delete=models.CASCADE, related_name='usage_rollups', verbose_name='插件')
+    class Meta(UsageRollup.Meta):
+        db_table = 'plugin_usage_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['plugin', 'period', 'start'], name='plugin_usage_rollup_unique'),
+        ]
+
+
+class VersionUsageRollup(UsageRollup):
+    SCOPE_FIELD = 'version'
+    SCOPE_LOOKUP = 'version_id'
+    version = models.ForeignKey(PluginVersion, on_delete=models.CASCADE, related_name='usage_rollups', verbose_name='插件版本')
+    class Meta(UsageRollup.Meta):
+        db_table = 'plugin_version_usage_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'period', 'start'], name='plugin_version_usage_rollup_unique'),
+        ]
+
+# 目录版本号，插件、版本、分类发生写操作时重新生成，用于目录类接口的缓存失效
+class CatalogRevision(ModelMixin):
+    NAME_CATALOG = 'catalog'
+    name = models.CharField(max_length=50, unique=True)
+    revision = models.CharField(max_length=32, verbose_name='版本号')
+    def __str__(self):
+        return f'{self.name}-{self.revision}'
+    class Meta:
+        db_table = 'plugin_catalog_revision'
+        ordering = ('id',)
+
+# 汇总检查点，记录已汇总的最大操作记录ID，plugin rollup 据此找出检查点之后写入的补报记录
+class RollupCheckpoint(ModelMixin):
+    NAME_OPERATION_LOG = 'operation_log'
+    # 操作记录的ID在事务提交前分配，检查点只前移到该时长之前写入的记录，避免遗漏提交较晚的记录
+    LAG = datetime.timedelta(minutes=10)
+    name = models.CharField(max_length=50, unique=True)
+    log_id = models.BigIntegerField(default=0, verbose_name='操作记录ID')
+
+    @classmethod
+    def load(cls, name: str = NAME_OPERATION_LOG) -> 'RollupCheckpoint':
+        """读取检查点，首次执行时以当前已写入的操作记录初始化，之前的记录由 plugin backfill 汇总"""
+        checkpoint = cls.objects.filter(name=name).first()
+        if checkpoint is None:
+            checkpoint = cls(name=name, log_id=OperationLog.objects.aggregate(log_id=Max('id'))['log_id'] or 0)
+        return checkpoint
+
+    def pending_days(self) -> tuple[set[datetime.date], int]:
+        """检查点之后写入的操作记录的发生日期（TIME_ZONE）及新的检查点
+
+        补报的记录写入时间晚于发生时间，需重新汇总其发生日期
+        """
+        logs = OperationLog.objects.filter(id__gt=self.log_id)
+        days = set(logs.annotate(day=TruncDate('occurred_at')).order_by().values_list('day', flat=True).distinct())
+        log_id = logs.filter(created_at__lt=timezone.now() - self.LAG).aggregate(log_id=Max('id'))['log_id']
+        return days, log_id or self.log_id
+
+    def __str__(self):
+        return f'{self.name}-{self.log_id}'
+    class Meta:
+        db_table = 'plugin_rollup_checkpoint'
+        ordering = ('id',)
@@ -0,0 +1,113 @@
+"""操作记录按月分区（PostgreSQL）
+
+plugin_operation_log 按 occurred_at 范围分区，每月一个分区，命名为 plugin_operation_log_p202610，
+未创建分区的月份写入默认分区 plugin_operation_log_default。分区边界为 TIME_ZONE 的月初，
+与按天汇总（OperationLogDaily）使用的日期一致。
+
+    plugin partition  预先创建当月及之后 OPERATION_LOG_PARTITION_AHEAD 个月的分区
+    plugin detach     汇总并分离超出 OPERATION_LOG_RETENTION_MONTHS 的分区，分离后的表可归档或删除
+"""
+import datetime
+import re
+from typing import List
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.plugin.models import OperationLog
+
+TABLE = OperationLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return value.replace(day=1)
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> datetime.date:
+    return month_start(timezone.localdate())
+
+
+def retention_start() -> datetime.date:
+    """保留期内最早的月份，更早的分区由 plugin detach 分离"""
+    return add_months(current_month(), -settings.OPERATION_LOG_RETENTION_MONTHS)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def month_bound(month: datetime.date) -> str:
+    """分区边界，TIME_ZONE 中该月1日零点"""
+    return datetime.datetime.combine(month, datetime.time.min, tzinfo=timezone.get_current_timezone()).isoformat()
+
+
+def is_partitioned() -> bool:
+    """操作记录表是否为分区表，非 PostgreSQL 数据库返回False"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions() -> List[datetime.date]:
+    """已挂载的月份分区，按月份升序"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s)', [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def first_partition() -> datetime.date | None:
+    """最早挂载的月份分区，之前的月份分区已分离，不是分区表或没有分区时返回None"""
+    months = list_partitions() if is_partitioned() else []
+    return months[0] if months else None
+
+
+def create_partition(month: datetime.date) -> bool:
+    """创建月份分区，已存在时返回False
+
+    先建普通表，将默认分区中该月的记录移入后再挂载，默认分区中已有该月记录时也能创建
+    """
+    if month in list_partitions():
+        return False
+    name, start, end = partition_name(month), month_bound(month), month_bound(add_months(month, 1))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) '
+                       f'INSERT INTO {name} SELECT * FROM moved', [start, end])
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+    return True
+
+
+def ensure_partitions(ahead: int) -> List[str]:
+    """创建当月及之后 ahead 个月的分区，返回新建的分区名"""
+    month = current_month()
+    created = []
+    for index in range(ahead + 1):
+        if create_partition(add_months(month, index)):
+            created.append(partition_name(add_months(month, index)))
+    return created
+
+
+def detach_partition(month: datetime.date, drop: bool = False):
+    """从主表分离月份分区，drop 为True时同时删除分离出的表
+
+    分离前需已完成该月的按天汇总
+    """
+    name = partition_name(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
@@ -1,13 +1,30 @@
+import arrow
+import gzip
 import json
 import random
-import uuid
+import time
+from unittest import mock
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
 from django.conf import settings
 from django.utils import timezone
+import datetime
 from datetime import timedelta
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from apps.account.models import Account
-from apps.plugin.models import OperationLog, Plugin, PluginCategory, PluginVersion
+from apps.account.models import Account, AccountSession
+from apps.plugin import partitions
+from apps.plugin.models import OperationLog, OperationLogDaily, Plugin, PluginCategory, PluginUsageRollup, PluginVersion, RollupCheckpoint, UsageRollup, VersionUsageRollup
+from libs.boost import json_backend
+from libs.boost.error import ShowType
+from apps.plugin.ingest import operation_log_buffer
+from apps.plugin.views import OperationLogView, PluginVersionView
+from const.error import ErrorType
+from libs.boost.parser import Argument, JsonParser, ModelArgument, ParseError
+from libs.boost.http import HttpStatus, JsonResponse, encode_cursor
 
 def get_token_by_account(account):
     return get_or_create_super_account(account=account).access_token
@@ -23,9 +40,9 @@ def get_or_create_super_account(account):
             can_admin=True,
             is_super=True,
             password_hash=Account.make_password(account),
-            access_token= uuid.uuid4().hex,
-            token_expired = timezone.now() + timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME)
         )
+    # 每次调用创建一个新会话，明文token挂在实例上供请求使用
+    _, accountObj.access_token = AccountSession.issue(accountObj)
     return accountObj
 
 def get_or_create_normal_account(account):
@@ -39,9 +56,9 @@ def get_or_create_normal_account(account):
             can_admin=False,
             is_super=False,
             password_hash=Account.make_password(account),
-            access_token= uuid.uuid4().hex,
-            token_expired = timezone.now() + timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME)
         )
+    # 每次调用创建一个新会话，明文token挂在实例上供请求使用
+    _, accountObj.access_token = AccountSession.issue(accountObj)
     return accountObj
 
 def get_first_category_and_children():
@@ -68,6 +85,12 @@ def generate_random_plugin_version_data(category):
                 "tags":["test"]
                 }
 
+def get_response_json(response):
+    # 兼容流式响应
+    if response.streaming:
+        return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+    return json.loads(response.content.decode('utf-8'))
+
 class PluginCatagoryViewTests(TestCase):
     def test_post_and_get_plugin(self):
         token = get_token_by_account(account="Lucas")
@@ -90,6 +113,36 @@ class PluginCatagoryViewTests(TestCase):
         response_json = json.loads(response.content.decode('utf-8'))
         self.assertEqual(response.success, True, response_json['errorMessage'])
 
+    def test_get_category_not_modified(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        response = self.client.get(reverse('plugin-category'), headers=headers)
+        etag = response['ETag']
+        response = self.client.get(reverse('plugin-category'), headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        data = json.dumps({'name':f'建筑分类{random.randint(1000,9999)}'})
+        self.client.post(reverse('plugin-category'), headers=headers, data=data, content_type='application/json')
+        response = self.client.get(reverse('plugin-category'), headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_get_category_tree(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        parent = PluginCategory.objects.create(name=f'建筑分类{random.randint(1000,9999)}')
+        PluginCategory.objects.create(name=f'建筑分类{random.randint(1000,9999)}', parent=parent)
+        self.client.get(reverse('plugin-category'), headers=headers)
+        data = json.dumps({'name':f'建筑分类{random.randint(1000,9999)}', 'parent_id': parent.id})
+        self.client.post(reverse('plugin-category'), headers=headers, data=data, content_type='application/json')
+        response = self.client.get(reverse('plugin-category'), headers=headers)
+        response_json = json.loads(response.content.decode('utf-8'))
+        node = next(item for item in response_json['data'] if item['id'] == parent.id)
+        self.assertEqual(len(node['children']), 2)
+        self.assertEqual(node['children'][0]['children'], [])
+        # 中文内容不做转义输出
+        self.assertIn(parent.name.encode('utf-8'), response.content)
+
 class PluginVersionViewTests(TestCase):
     def test_post_and_get_plugin(self):
         token = get_token_by_account(account="Lucas")
@@ -110,7 +163,7 @@ class PluginVersionViewTests(TestCase):
         data = {'name': data['name'], 'category_id':category['id']}
         response = self.client.get(reverse('plugin-version'), headers=headers, data=data)
         self.assertEqual(response.status_code, 200)
-        response_json = json.loads(response.content.decode('utf-8'))
+        response_json = get_response_json(response)
         self.assertEqual(response.success, True, response_json['errorMessage'])
         self.assertEqual(1, len(response_json['data']))
         self.assertEqual(response_json['data'][0]['name'], data['name'])
@@ -120,6 +173,119 @@ class PluginVersionViewTests(TestCase):
         response_json = json.loads(response.content.decode('utf-8'))
         self.assertEqual(response.success, True, response_json['errorMessage'])
 
+    def test_version_post_and_delete_keep_latest(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        category = get_first_category_and_children()
+        response = self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        plugin = Plugin.objects.get(id=response.json()['data'])
+        first_version_id = plugin.latest_version_id
+        self.assertIsNotNone(first_version_id)
+        data = {'app_id': plugin.id, 'version_no': '0.0.2.test', 'description': 'new version', 'attachment_url': 'http://test.com/12346.zip', 'authors': []}
+        response = self.client.post(reverse('plugin-version'), headers=headers, data=json.dumps(data), content_type='application/json')
+        second_version_id = response.json()['data']
+        plugin.refresh_from_db()
+        self.assertEqual(plugin.latest_version_id, second_version_id)
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'category_id': category['id']})
+        self.assertEqual(get_response_json(response)['data'][0]['versionId'], second_version_id)
+        response = self.client.delete(f"{reverse('plugin-version')}?id={second_version_id}", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        plugin.refresh_from_db()
+        self.assertEqual(plugin.latest_version_id, first_version_id)
+
+    def test_version_list_cache_refresh_after_write(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        category = get_first_category_and_children()
+        self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'category_id': category['id']})
+        count = len(get_response_json(response)['data'])
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'category_id': category['id']})
+        self.assertEqual(count, len(get_response_json(response)['data']))
+        self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'category_id': category['id']})
+        self.assertEqual(count + 1, len(get_response_json(response)['data']))
+
+    def test_version_list_search(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        category = get_first_category_and_children()
+        data = generate_random_plugin_version_data(category)
+        data['tags'] = ['幕墙工具']
+        response = self.client.post(reverse('plugin'), headers=headers, data=json.dumps(data), content_type='application/json')
+        plugin_id = response.json()['data']
+        version = {'app_id': plugin_id, 'version_no': '0.0.2.test', 'description': 'Support Revit 2024', 'attachment_url': 'http://test.com/12346.zip', 'authors': []}
+        self.client.post(reverse('plugin-version'), headers=headers, data=json.dumps(version), content_type='application/json')
+        for keyword in ['幕墙', 'revit', data['name'].lower()]:
+            response = self.client.get(reverse('plugin-version'), headers=headers, data={'filter': keyword})
+            self.assertEqual([plugin_id], [item['id'] for item in get_response_json(response)['data']], keyword)
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'filter': 'not-exists-keyword'})
+        self.assertEqual(0, len(get_response_json(response)['data']))
+
+    def test_version_list_compressed(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        category = get_first_category_and_children()
+        for _ in range(3):
+            self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        response = self.client.get(reverse('plugin-version'), headers=headers, data={'category_id': category['id']})
+        expected = get_response_json(response)['data']
+        for _ in range(2):
+            response = self.client.get(reverse('plugin-version'), headers={**headers, 'Accept-Encoding': 'gzip, deflate'}, data={'category_id': category['id']})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertTrue(response['ETag'].startswith('W/'))
+            self.assertEqual(expected, json.loads(gzip.decompress(response.content))['data'])
+        response = self.client.get(reverse('plugin-version'), headers={**headers, 'If-None-Match': response['ETag']}, data={'category_id': category['id']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('plugin-version'), headers={**headers, 'Accept-Encoding': 'gzip;q=0'}, data={'category_id': category['id']})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_use_count_order_refreshed_by_window(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        category = get_first_category_and_children()
+        for _ in range(2):
+            self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        params = {'category_id': category['id'], 'order': PluginVersionView.ORDER_USE}
+
+        def plugin_ids():
+            response = self.client.get(reverse('plugin-version'), headers=headers, data=params)
+            return list(dict.fromkeys(item['id'] for item in get_response_json(response)['data']))
+
+        window = (time.time() // settings.CATALOG_USE_COUNT_WINDOW) * settings.CATALOG_USE_COUNT_WINDOW
+        with mock.patch('apps.plugin.views.time.time', return_value=window):
+            ids = plugin_ids()
+            plugin = Plugin.objects.get(id=ids[0])
+            PluginVersion.increase_use_count(plugin.latest_version_id, plugin.id, 10)
+            # 使用次数累加不更新目录版本号，同一时间段内返回缓存
+            self.assertEqual(ids, plugin_ids())
+        with mock.patch('apps.plugin.views.time.time', return_value=window + settings.CATALOG_USE_COUNT_WINDOW):
+            self.assertEqual(plugin.id, plugin_ids()[-1])
+
+    def test_version_resolve(self):
+        account = get_or_create_super_account(account="Lucas")
+        headers = {'X-Token': account.access_token}
+        plugin = Plugin.objects.create(name='Resolve', icon_url='dddd', type=Plugin.TYPE_LINK, created_user=account)
+        versions = [PluginVersion.objects.create(plugin=plugin, version_no=f'1.0.{i}', description='Test', attachment_url='url', created_user=account) for i in range(3)]
+        PluginVersion.objects.filter(id=versions[2].id).update(deleted_at=timezone.now())
+        ids = [version.id for version in versions] + [999999]
+        # 预热认证缓存，使两次请求的查询次数可比较
+        self.client.get(reverse('plugin-category'), headers=headers)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('plugin-version-resolve'), headers=headers, data=json.dumps({'ids': ids}), content_type='application/json')
+        response_json = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(response.success, True, response_json['errorMessage'])
+        self.assertEqual([versions[0].id, versions[1].id], sorted(item['versionId'] for item in response_json['data']['list']))
+        self.assertEqual([versions[2].id], response_json['data']['deletedIds'])
+        self.assertEqual([999999], response_json['data']['unknownIds'])
+        query_count = len(context.captured_queries)
+        ids += [version.id for version in PluginVersion.objects.all()]
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('plugin-version-resolve'), headers=headers, data=json.dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(query_count, len(context.captured_queries))
+        response = self.client.post(reverse('plugin-version-resolve'), headers=headers, data=json.dumps({'ids': ['a']}), content_type='application/json')
+        self.assertEqual(response.success, False)
+
 class OperationLogViewTests(TestCase):
     def setUp(self):
         # 准备测试数据，例如创建一个插件实例
@@ -141,20 +307,155 @@ class OperationLogViewTests(TestCase):
         url = reverse('plugin-log')
         response = self.client.get(url, headers=headers, data=data)
         self.assertEqual(response.status_code, 200)
-        response_json = json.loads(response.content.decode('utf-8'))
+        response_json = get_response_json(response)
         self.assertEqual(response.success, True, response_json['errorMessage'])
-        count = len(response_json['data'])
+        count = len(response_json['data']['list'])
         data = {'type':OperationLog.TYPE_OPEN,'version_id': self.plugin_version.id }
         json_data = json.dumps(data)
         response = self.client.post(url, headers=headers, data=json_data, content_type='application/json')
         self.assertEqual(response.status_code, 200)
         response_json = json.loads(response.content.decode('utf-8'))
         self.assertEqual(response.success, True, response_json['errorMessage'])
+        operation_log_buffer.flush()
         response = self.client.get(url, headers=headers, data=data)
         self.assertEqual(response.status_code, 200)
-        response_json = json.loads(response.content.decode('utf-8'))
+        response_json = get_response_json(response)
         self.assertEqual(response.success, True, response_json['errorMessage'])
+        self.assertEqual(count + 1, len(response_json['data']['list']))
+        self.assertEqual(response_json['data']['list'][0]['pluginName'], self.plugin.name)
+        # 导出时流式返回全部数据
+        data = {**data, 'export': 'true'}
+        response = self.client.get(url, headers=headers, data=data)
+        response_json = get_response_json(response)
+        self.assertTrue(response.streaming)
         self.assertEqual(count + 1, len(response_json['data']))
+        self.assertEqual(response_json['statusCode'], 200)
+        response = self.client.get(url, headers={**headers, 'Accept-Encoding': 'gzip'}, data=data)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response_json['data'], json.loads(gzip.decompress(b''.join(response.streaming_content)))['data'])
+
+    def test_get_log_paginated(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        account = get_or_create_super_account(account="Lucas")
+        now = timezone.now()
+        for days in range(5):
+            for type in (OperationLog.TYPE_OPEN, OperationLog.TYPE_INSTALL):
+                OperationLog.objects.create(version=self.plugin_version, created_user=account, type=type, occurred_at=now - timedelta(days=days))
+        url = reverse('plugin-log')
+        self.client.get(reverse('userinfo'), headers=headers)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers=headers, data={'version_id': self.plugin_version.id, 'page_size': 4})
+        # 一次关联查询，不随数据量增加
+        self.assertEqual(1, len(context.captured_queries))
+        self.assertIn('JOIN "plugin"', context.captured_queries[0]['sql'])
+        page = response.json()['data']
+        self.assertEqual(4, len(page['list']))
+        occurred = [item['occurredAt'] for item in page['list']]
+        self.assertEqual(sorted(occurred, reverse=True), occurred)
+        ids = [item['id'] for item in page['list']]
+        while page['nextCursor']:
+            page = self.client.get(url, headers=headers, data={'version_id': self.plugin_version.id, 'page_size': 4, 'cursor': page['nextCursor']}).json()['data']
+            ids += [item['id'] for item in page['list']]
+        self.assertEqual(10, len(set(ids)))
+        # 按类型及日期范围过滤，结束日期包含当天
+        today = timezone.localdate()
+        response = self.client.get(url, headers=headers, data={'version_id': self.plugin_version.id, 'type': OperationLog.TYPE_INSTALL,
+                                                               'start': str(today - timedelta(days=1)), 'end': str(today), 'with_count': 'true'})
+        page = response.json()['data']
+        self.assertEqual(2, page['totalCount'])
+        self.assertEqual({OperationLog.TYPE_INSTALL}, {item['type'] for item in page['list']})
+        response = self.client.get(url, headers=headers, data={'version_id': self.plugin_version.id, 'start': 'today'})
+        self.assertFalse(response.json()['success'])
+        # 游标中的发生时间不合法时返回参数错误
+        for value in (['abc', 1], [[1], 1], [None, 1], ['2024-13-45 00:00:00', 1], [now.isoformat(), None]):
+            response = self.client.get(url, headers=headers, data={'version_id': self.plugin_version.id, 'cursor': encode_cursor(*value)})
+            self.assertEqual(200, response.status_code, value)
+            self.assertEqual('分页游标不合法', response.json()['errorMessage'], value)
+
+    def test_post_log_increase_use_count(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        for type in (OperationLog.TYPE_OPEN, OperationLog.TYPE_RUN):
+            data = json.dumps({'type': type, 'version_id': self.plugin_version.id})
+            response = self.client.post(reverse('plugin-log'), headers=headers, data=data, content_type='application/json')
+            # 记录进入缓冲区，返回接收数量而不是操作记录ID
+            self.assertEqual({'accepted': 1}, response.json()['data'])
+        response = self.client.post(reverse('plugin-log'), headers=headers, content_type='application/json',
+                                    data=json.dumps({'type': 99, 'version_id': self.plugin_version.id}))
+        self.assertEqual('操作类型不合法', response.json()['errorMessage'])
+        operation_log_buffer.flush()
+        self.plugin_version.refresh_from_db()
+        self.plugin.refresh_from_db()
+        self.assertEqual(2, self.plugin_version.use_count)
+        self.assertEqual(2, self.plugin.use_count)
+        PluginVersion.objects.filter(id=self.plugin_version.id).update(use_count=0)
+        call_command('plugin', 'counter', stdout=StringIO())
+        self.plugin_version.refresh_from_db()
+        self.assertEqual(2, self.plugin_version.use_count)
+
+    def test_post_log_batch(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        occurred_at = timezone.now() - timedelta(days=3)
+        events = [
+            {'versionId': self.plugin_version.id, 'type': OperationLog.TYPE_OPEN, 'occurredAt': occurred_at.isoformat()},
+            {'versionId': self.plugin_version.id, 'type': OperationLog.TYPE_RUN},
+            {'versionId': 999999, 'type': OperationLog.TYPE_OPEN},
+            {'versionId': self.plugin_version.id, 'type': 99},
+            {'versionId': self.plugin_version.id, 'type': OperationLog.TYPE_INSTALL, 'occurredAt': 'yesterday'},
+            {'versionId': self.plugin_version.id, 'type': OperationLog.TYPE_INSTALL, 'occurredAt': (timezone.now() + timedelta(days=1)).isoformat()},
+            {'versionId': self.plugin_version.id, 'type': OperationLog.TYPE_INSTALL,
+             'occurredAt': (timezone.now() - timedelta(days=31 * (settings.OPERATION_LOG_RETENTION_MONTHS + 1))).isoformat()},
+            '[1]',
+            7,
+        ]
+        self.client.get(reverse('userinfo'), headers=headers)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('plugin-log-batch'), headers=headers, data=json.dumps({'events': events}), content_type='application/json')
+        data = response.json()['data']
+        self.assertEqual(2, data['accepted'])
+        self.assertEqual(7, data['rejected'])
+        self.assertEqual([True, True, False, False, False, False, False, False, False], [result['success'] for result in data['results']])
+        self.assertEqual('插件版本不存在', data['results'][2]['errorMessage'])
+        self.assertEqual('发生时间不合法', data['results'][6]['errorMessage'])
+        self.assertEqual('操作记录格式不合法', data['results'][7]['errorMessage'])
+        # 一次查询校验版本，一条语句写入
+        sqls = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(1, len([sql for sql in sqls if sql.startswith('SELECT') and 'FROM "plugin_version"' in sql]))
+        self.assertEqual(1, len([sql for sql in sqls if sql.startswith('INSERT INTO "plugin_operation_log"')]))
+        logs = OperationLog.objects.filter(version=self.plugin_version).order_by('id')
+        self.assertEqual(occurred_at, logs[0].occurred_at)
+        self.assertEqual(OperationLog.TYPE_RUN, logs[1].type)
+        self.plugin.refresh_from_db()
+        self.assertEqual(2, self.plugin.use_count)
+        response = self.client.post(reverse('plugin-log-batch'), headers=headers, data=json.dumps({'events': []}), content_type='application/json')
+        self.assertFalse(response.json()['success'])
+
+    @override_settings(OPERATION_LOG_BUFFER_SIZE=3, OPERATION_LOG_FLUSH_INTERVAL=3600)
+    def test_post_log_buffered(self):
+        token = get_token_by_account(account="Lucas")
+        headers = {'X-Token': token}
+        operation_log_buffer.flush()
+        data = json.dumps({'type': OperationLog.TYPE_INSTALL, 'version_id': self.plugin_version.id})
+        self.client.post(reverse('plugin-log'), headers=headers, data=data, content_type='application/json')
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(4):
+                response = self.client.post(reverse('plugin-log'), headers=headers, data=data, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+        # 第3条时达到缓冲区大小，3条记录一次写入
+        inserts = [query['sql'] for query in context.captured_queries if query['sql'].startswith('INSERT INTO "plugin_operation_log"')]
+        self.assertEqual(1, len(inserts))
+        self.assertEqual(3, OperationLog.objects.filter(version=self.plugin_version).count())
+        self.assertEqual(2, len(operation_log_buffer))
+        self.assertEqual(2, operation_log_buffer.stop())
+        self.plugin_version.refresh_from_db()
+        self.assertEqual(5, self.plugin_version.use_count)
+        # 不存在的版本不进入缓冲区
+        response = self.client.post(reverse('plugin-log'), headers=headers, content_type='application/json',
+                                    data=json.dumps({'type': OperationLog.TYPE_OPEN, 'version_id': 999999}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(0, len(operation_log_buffer))
 
 class AdminRequiredTest(TestCase):
     def setUp(self):
@@ -173,6 +474,17 @@ class AdminRequiredTest(TestCase):
         response = self.client.get(url, headers=headers)
         self.assertEqual(response.status_code, 200)
 
+    def test_list_page_size_bounds(self):
+        headers = {'X-Token': self.super_user.access_token}
+        for url in (reverse('plugin-list'), reverse('plugin-version-list'), reverse('get_all_accounts')):
+            for page_size in (0, -1, 10 ** 7):
+                for params in ({'current': 1}, {'cursor': ''}):
+                    response = self.client.get(url, headers=headers, data={**params, 'page_size': page_size})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(response.json()['success'])
+            response = self.client.get(url, headers=headers, data={'cursor': '', 'page_size': 100})
+            self.assertTrue(response.json()['success'])
+
     def test_plugin_version_list_view(self):
         token = self.normal_user.access_token 
         headers = {'X-Token': token}
@@ -211,6 +523,7 @@ class AdminRequiredTest(TestCase):
         self.assertEqual(response.status_code, 200)
         response_json = json.loads(response.content.decode('utf-8'))
         self.assertEqual(response.success, True, response_json['errorMessage'])
+        operation_log_buffer.flush()
         data = {'name':f'建筑分类{random.randint(1000,9999)}','id':response_json['data'] }
         response = self.client.post(url, headers=headers, data=json_data, content_type='application/json')
         json_data = json.dumps(data)
@@ -246,6 +559,301 @@ class AdminRequiredTest(TestCase):
         response = self.client.patch(reverse('plugin'), headers=headers, data=json_data_plugin, content_type='application/json')
         self.assertEqual(response.status_code, 200)
 
+    def test_list_query_count_constant(self):
+        headers = {'X-Token': self.super_user.access_token}
+        category = get_first_category_and_children()
+        urls = [
+            (reverse('plugin-list'), {}),
+            (reverse('plugin-version-list'), {}),
+            (reverse('plugin-release'), {}),
+            (reverse('plugin-version'), {'category_id': category['id']}),
+            (reverse('category-list'), {'view': 'main'}),
+            (reverse('category-list'), {'view': 'second'}),
+        ]
+        def count_queries():
+            counts = []
+            for url, data in urls:
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url, headers=headers, data=data)
+                self.assertEqual(response.status_code, 200)
+                counts.append(len(context.captured_queries))
+            return counts
+        self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        counts = count_queries()
+        for _ in range(3):
+            self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        self.assertEqual(counts, count_queries())
+
+    def test_category_list_counts(self):
+        headers = {'X-Token': self.super_user.access_token}
+        category = get_first_category_and_children()
+        PluginCategory.objects.create(name='建筑专项', parent_id=category['id'])
+        for _ in range(2):
+            self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        response = self.client.get(reverse('category-list'), headers=headers, data={'view': 'main', 'page_size': 100})
+        response_json = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(response.success, True, response_json['errorMessage'])
+        item = next(item for item in response_json['data']['list'] if item['id'] == category['id'])
+        self.assertEqual(item['childrenCount'], 2)
+        self.assertEqual(item['appCount'], 2)
+        response = self.client.get(reverse('category-list'), headers=headers, data={'view': 'second', 'page_size': 100})
+        response_json = json.loads(response.content.decode('utf-8'))
+        item = next(item for item in response_json['data']['list'] if item['id'] == category['children_id'])
+        self.assertEqual(item['parentName'], category['name'])
+        self.assertEqual(item['appCount'], 2)
+
+    def test_plugin_list_cursor_pagination(self):
+        headers = {'X-Token': self.super_user.access_token}
+        category = get_first_category_and_children()
+        for _ in range(3):
+            self.client.post(reverse('plugin'), headers=headers, data=json.dumps(generate_random_plugin_version_data(category)), content_type='application/json')
+        expected_ids = list(Plugin.objects.order_by('id').values_list('id', flat=True))
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get(reverse('plugin-list'), headers=headers, data={'cursor': cursor, 'pageSize': 2, 'withCount': 'true'})
+            response_json = response.json()
+            self.assertEqual(response.success, True, response_json['errorMessage'])
+            self.assertEqual(len(expected_ids), response_json['data']['totalCount'])
+            ids += [item['id'] for item in response_json['data']['list']]
+            cursor = response_json['data']['nextCursor']
+        self.assertEqual(expected_ids, ids)
+        response = self.client.get(reverse('plugin-list'), headers=headers, data={'cursor': 'invalid'})
+        self.assertEqual(response.json()['success'], False)
+        # 游标中的值类型或范围不合法时返回参数错误
+        for value in (['abc', 1], [[1], 1], [None, 1], ['1', 'abc'], ['1', 2 ** 70], [True, 1], [str(2 ** 70), 1]):
+            cursor = encode_cursor(*value)
+            for name in ('plugin-list', 'plugin-version-list'):
+                response = self.client.get(reverse(name), headers=headers, data={'cursor': cursor})
+                self.assertEqual(200, response.status_code, (name, value))
+                self.assertEqual('分页游标不合法', response.json()['errorMessage'], (name, value))
+
+class JsonBackendTests(TestCase):
+    def setUp(self):
+        self.backend = json_backend.get_backend()
+
+    def tearDown(self):
+        json_backend.use_backend(self.backend)
+
+    def test_backends_render_identical_bytes(self):
+        now = timezone.now()
+        data = [{'id': index, 'plugin_name': f'插件{index}', 'created_at': now, 'day': now.date(), 'updated': arrow.get(now),
+                 'size': Decimal('1.5'), 'type': ShowType.MESSAGE_ERROR, 'tags': ['幕墙'], 'link': None} for index in range(3)]
+        outputs = set()
+        for name in ('json', 'orjson'):
+            try:
+                json_backend.use_backend(name)
+            except KeyError:
+                continue
+            outputs.add((JsonResponse(data, host='localhost').content, json_backend.dumps({1: data})))
+        self.assertEqual(1, len(outputs))
+        content, _ = outputs.pop()
+        self.assertEqual(json.loads(content)['data'][0]['pluginName'], '插件0')
+        self.assertEqual(json.loads(content)['data'][0]['createdAt'], now.strftime('%Y-%m-%d %H:%M:%S'))
+
+    def test_backends_agree_on_edge_numbers(self):
+        data = [1e16, 1e-7, 1e22, -1.5e-5, 0.1, 0.0, -0.0, 5e-324, float('nan'), float('inf'), float('-inf'), 2 ** 70,
+                Decimal('1e20'), {'size': Decimal('NaN')}]
+        text = '[123456789012345678901234567890,-9223372036854775809,18446744073709551615,1.5,"12345678901234567890"]'
+        outputs = set()
+        for name in ('json', 'orjson'):
+            try:
+                json_backend.use_backend(name)
+            except KeyError:
+                continue
+            outputs.add((json_backend.dumps(data), repr(json_backend.loads(text)), repr(json_backend.loads(text.encode()))))
+        self.assertEqual(1, len(outputs))
+        dumped, loaded, _ = outputs.pop()
+        self.assertIn('1e+16,1e-07', dumped)
+        # NaN、Infinity 不是合法的 json，两种后端均输出 null
+        self.assertIn('null,null,null,1180591620717411303424', dumped)
+        self.assertTrue(dumped.endswith('{"size":null}]'))
+        self.assertEqual(repr([123456789012345678901234567890, -9223372036854775809, 18446744073709551615, 1.5, '12345678901234567890']), loaded)
+
+class JsonResponseTests(TestCase):
+    def test_error_response_body_cached(self):
+        first = JsonResponse(error_type=ErrorType.TOKEN_EXPIRED, status_code=HttpStatus.HTTP_401_UNAUTHORIZED)
+        second = JsonResponse(error_type=ErrorType.TOKEN_EXPIRED, status_code=HttpStatus.HTTP_401_UNAUTHORIZED)
+        self.assertIs(first.content, second.content)
+        self.assertEqual(second.status_code, 401)
+        self.assertEqual(json.loads(second.content), {
+            'data': {}, 'statusCode': 401, 'errorType': list(ErrorType.TOKEN_EXPIRED.value), 'errorCode': ErrorType.TOKEN_EXPIRED.code,
+            'errorMessage': ErrorType.TOKEN_EXPIRED.message, 'showType': ShowType.MESSAGE_ERROR.value, 'success': False, 'host': first.host,
+        })
+        self.assertNotEqual(first.content, JsonResponse(error_type=ErrorType.TOKEN_EXPIRED, status_code=HttpStatus.HTTP_403_FORBIDDEN).content)
+
+class JsonParserTests(TestCase):
+    def test_compiled_converters_match_check_type(self):
+        values = [1, '2', True, 'true', 'False', 'yes', 0, '[1, 2]', '{"a": 1}', [3], {'b': 2}, 1.5, '']
+        for data_type in (int, str, bool, list, dict, float):
+            argument = Argument('value', data_type=data_type)
+            for value in values:
+                try:
+                    expected = argument._check_type(value)
+                except ParseError:
+                    expected = ParseError
+                result, error = JsonParser(argument).parse({'value': value})
+                self.assertEqual(expected, ParseError if error else result['value'], (data_type, value))
+
+    def test_parser_reused_across_requests(self):
+        parser = OperationLogView.POST_PARSER
+        form, error = parser.parse(json.dumps({'version_id': '1', 'type': OperationLog.TYPE_INSTALL}))
+        self.assertIsNone(error)
+        self.assertEqual(1, form.version_id)
+        form, error = parser.parse(json.dumps({'version_id': 'a', 'type': OperationLog.TYPE_INSTALL}))
+        self.assertIsNone(form)
+        form, error = parser.parse({'version_id': 2, 'type': OperationLog.TYPE_INSTALL})
+        self.assertEqual(2, form.version_id)
+
+    def test_model_argument_resolves_once(self):
+        account = get_or_create_super_account(account="Lucas")
+        plugin = Plugin.objects.create(name='Test', icon_url='dddd', type=Plugin.TYPE_LINK, created_user=account)
+        version = PluginVersion.objects.create(plugin=plugin, version_no='1.0.0', description='Test', attachment_url='url', created_user=account)
+        parser = JsonParser(ModelArgument('id', model=PluginVersion, dest='version', select_related=('plugin',)))
+        with CaptureQueriesContext(connection) as context:
+            form, error = parser.parse({'id': str(version.id)})
+            self.assertEqual(plugin.name, form.version.plugin.name)
+        self.assertEqual(1, len(context.captured_queries))
+        self.assertNotIn('id', form)
+        PluginVersion.objects.filter(id=version.id).update(deleted_at=timezone.now())
+        form, error = parser.parse({'id': version.id})
+        self.assertIsNone(form)
+        self.assertEqual('Value Error: id object does not exist', error)
+
+
+class UsageRollupTests(TestCase):
+    def setUp(self):
+        self.account = get_or_create_super_account(account="Lucas")
+        self.other = get_or_create_normal_account(account="Kevin")
+        plugin = Plugin.objects.create(name='Rollup', icon_url='dddd', type=Plugin.TYPE_LINK, created_user=self.account)
+        self.version = PluginVersion.objects.create(plugin=plugin, version_no='1.0.0', description='Test', attachment_url='url', created_user=self.account)
+
+    def log(self, occurred_at, account=None, type=OperationLog.TYPE_OPEN):
+        return OperationLog.objects.create(version=self.version, created_user=account or self.account, type=type, occurred_at=occurred_at)
+
+    def test_rollup(self):
+        today = timezone.localdate()
+        now = timezone.now()
+        for account in (self.account, self.account, self.other):
+            self.log(now, account)
+        self.log(now - timedelta(days=1))
+        self.log(now, type=OperationLog.TYPE_INSTALL)
+        call_command('plugin', 'rollup', stdout=StringIO())
+        rows = {(row.type, row.day): (row.count, row.user_count) for row in OperationLogDaily.objects.filter(version=self.version)}
+        self.assertEqual({
+            (OperationLog.TYPE_OPEN, today): (3, 2),
+            (OperationLog.TYPE_OPEN, today - timedelta(days=1)): (1, 1),
+            (OperationLog.TYPE_INSTALL, today): (1, 1),
+        }, rows)
+        # 重新汇总覆盖已有的汇总行
+        self.log(now, self.other)
+        call_command('plugin', 'rollup', '--days', '1', stdout=StringIO())
+        daily = OperationLogDaily.objects.get(version=self.version, type=OperationLog.TYPE_OPEN, day=today)
+        self.assertEqual((4, 2), (daily.count, daily.user_count))
+        self.assertEqual(3, OperationLogDaily.objects.count())
+
+    def test_rollup_late_logs(self):
+        now = timezone.now()
+        self.log(now - timedelta(days=20))
+        # 首次执行只记录检查点，之前写入的记录由 backfill 汇总
+        call_command('plugin', 'rollup', stdout=StringIO())
+        self.assertFalse(OperationLogDaily.objects.exists())
+        # 检查点之后补报的记录，重新汇总其发生日期
+        late = self.log(now - timedelta(days=10))
+        self.log(now - timedelta(days=10), self.other)
+        self.log(now - timedelta(days=9))
+        stdout = StringIO()
+        call_command('plugin', 'rollup', stdout=stdout)
+        self.assertIn('补报日期2天', stdout.getvalue())
+        self.assertEqual((2, 2), OperationLogDaily.objects.filter(day=timezone.localdate(late.occurred_at)).values_list('count', 'user_count').get())
+        self.assertTrue(VersionUsageRollup.objects.filter(period=UsageRollup.PERIOD_DAY, start=timezone.localdate(late.occurred_at)).exists())
+        self.assertFalse(OperationLogDaily.objects.filter(day=timezone.localdate(now - timedelta(days=20))).exists())
+        # 检查点只前移到 LAG 之前写入的记录
+        OperationLog.objects.filter(id__gte=late.id).update(created_at=now - RollupCheckpoint.LAG * 2)
+        call_command('plugin', 'rollup', stdout=StringIO())
+        self.assertEqual(OperationLog.objects.order_by('-id').first().id, RollupCheckpoint.objects.get().log_id)
+
+    def test_partition_and_detach(self):
+        self.assertTrue(partitions.is_partitioned())
+        # 尚未创建分区的月份先写入默认分区，创建分区时移入
+        month = partitions.add_months(partitions.current_month(), 24)
+        log = self.log(datetime.datetime.combine(month, datetime.time(12), tzinfo=timezone.get_current_timezone()))
+        self.assertTrue(partitions.create_partition(month))
+        self.assertFalse(partitions.create_partition(month))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM plugin_operation_log WHERE id = %s', [log.id])
+            self.assertEqual(partitions.partition_name(month), cursor.fetchone()[0])
+        OperationLogDaily.rollup(month, partitions.add_months(month, 1))
+        partitions.detach_partition(month, drop=True)
+        self.assertNotIn(month, partitions.list_partitions())
+        self.assertFalse(OperationLog.objects.filter(id=log.id).exists())
+        # 分离后再次汇总不影响已有的汇总数据
+        OperationLogDaily.rollup(month, partitions.add_months(month, 1))
+        self.assertEqual(1, OperationLogDaily.objects.get(version=self.version, day=month).count)
 
+    def test_counter_after_detach(self):
+        # 分离最早的分区后，重新计算使用次数时保留其汇总数据
+        month = partitions.add_months(partitions.list_partitions()[0], -1)
+        self.log(datetime.datetime.combine(month, datetime.time(12), tzinfo=timezone.get_current_timezone()))
+        self.log(timezone.now(), self.other)
+        self.assertTrue(partitions.create_partition(month))
+        OperationLogDaily.rollup(month, partitions.add_months(month, 1))
+        partitions.detach_partition(month, drop=True)
+        call_command('plugin', 'counter', stdout=StringIO())
+        self.version.refresh_from_db()
+        self.assertEqual(2, self.version.use_count)
+        self.assertEqual(2, Plugin.objects.get(id=self.version.plugin_id).use_count)
 
+    def test_rollup_after_detach_keeps_crossing_week(self):
+        # 找到1日不是周一的月份，其第一周从上个月开始
+        month = partitions.list_partitions()[0]
+        while month.weekday() == 0:
+            month = partitions.add_months(month, -1)
+        week = month - timedelta(days=month.weekday())
+        tz = timezone.get_current_timezone()
+        self.log(datetime.datetime.combine(week, datetime.time(12), tzinfo=tz))
+        self.log(datetime.datetime.combine(month, datetime.time(12), tzinfo=tz), self.other)
+        detached = partitions.add_months(month, -1)
+        while detached < partitions.list_partitions()[0]:
+            partitions.create_partition(detached)
+            detached = partitions.add_months(detached, 1)
+        call_command('plugin', 'backfill', '--start', str(week), stdout=StringIO())
+        rollup = PluginUsageRollup.objects.get(plugin=self.version.plugin, period=UsageRollup.PERIOD_WEEK, start=week)
+        self.assertEqual((2, 2), (rollup.opens, rollup.users))
+        # 分离该周开始的月份后，重新汇总不覆盖跨月的周
+        partitions.detach_partition(partitions.month_start(week), drop=True)
+        call_command('plugin', 'backfill', '--start', str(week), stdout=StringIO())
+        rollup.refresh_from_db()
+        self.assertEqual((2, 2), (rollup.opens, rollup.users))
+        self.assertEqual(1, OperationLogDaily.objects.get(version=self.version, day=week).count)
+        self.assertEqual(1, PluginUsageRollup.objects.get(plugin=self.version.plugin, period=UsageRollup.PERIOD_DAY, start=month).opens)
 
+    def test_usage(self):
+        headers = {'X-Token': self.account.access_token}
+        other_version = PluginVersion.objects.create(plugin=self.version.plugin, version_no='1.0.1', description='Test', attachment_url='url', created_user=self.account)
+        today = timezone.localdate()
+        noon = datetime.datetime.combine(today, datetime.time(12), tzinfo=timezone.get_current_timezone())
+        self.log(noon - timedelta(days=2))
+        self.log(noon, type=OperationLog.TYPE_INSTALL)
+        self.log(noon, self.other, type=OperationLog.TYPE_RUN)
+        OperationLog.objects.create(version=other_version, created_user=self.account, occurred_at=noon)
+        call_command('plugin', 'backfill', stdout=StringIO())
+        self.assertTrue(PluginUsageRollup.objects.filter(plugin=self.version.plugin).exists())
+        params = {'start': str(today - timedelta(days=3)), 'end': str(today)}
+        self.client.get(reverse('userinfo'), headers=headers)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('plugin-usage'), headers=headers, data={'pluginId': self.version.plugin_id, **params})
+        # 插件、汇总表各一次查询
+        self.assertEqual(2, len(context.captured_queries))
+        data = response.json()['data']
+        self.assertEqual(4, len(data['series']))
+        self.assertEqual({'start': str(today - timedelta(days=3)), 'opens': 0, 'installs': 0, 'runs': 0, 'users': 0}, data['series'][0])
+        self.assertEqual({'start': str(today), 'opens': 1, 'installs': 1, 'runs': 1, 'users': 2}, data['series'][-1])
+        self.assertEqual({'opens': 2, 'installs': 1, 'runs': 1}, data['total'])
+        response = self.client.get(reverse('plugin-version-usage'), headers=headers, data={'versionId': self.version.id, 'period': 'week', **params})
+        data = response.json()['data']
+        monday = today - timedelta(days=today.weekday())
+        self.assertEqual(str(monday), data['series'][-1]['start'])
+        self.assertEqual({'opens': 1, 'installs': 1, 'runs': 1}, data['total'])
+        response = self.client.get(reverse('plugin-usage'), headers=headers, data={'pluginId': self.version.plugin_id, 'start': str(today), 'end': str(today - timedelta(days=1))})
+        self.assertFalse(response.json()['success'])
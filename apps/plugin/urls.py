@@ -9,8 +9,12 @@ urlpatterns = [
     path('/releases', PluginPublishListView.as_view(), name='plugin-release'),
     path('/list', PluginListView.as_view(), name='plugin-list'),
     path('/version', PluginVersionView.as_view(), name='plugin-version'),
+    path('/version/resolve', PluginVersionResolveView.as_view(), name='plugin-version-resolve'),
     path('/version/list', PluginVersionListView.as_view(), name='plugin-version-list'),
     path('/version/detail', PluginVersionDetailView.as_view(), name='plugin-detail'),
     path('/version/log', OperationLogView.as_view(), name='plugin-log'),
+    path('/version/log/batch', OperationLogBatchView.as_view(), name='plugin-log-batch'),
+    path('/usage', PluginUsageView.as_view(), name='plugin-usage'),
+    path('/version/usage', PluginVersionUsageView.as_view(), name='plugin-version-usage'),
     path('/category/list', PluginCategoryListView.as_view(), name='category-list'),
 ]
\ No newline at end of file
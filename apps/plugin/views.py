@@ -1,17 +1,29 @@
-from django.http import HttpRequest
-from django.shortcuts import get_object_or_404, render
+from django.conf import settings
+from django.http import Http404, HttpRequest
+from django.shortcuts import render
 from django.views import View
 from django.db import transaction, models
-from django.db.models import Count,Max
+from django.db.models import Count
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import datetime
+import time
+from datetime import timedelta
 import loguru
-from django.db.models import Q
+from collections import defaultdict
+from django.db.models import Q, F, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import SearchQuery, SearchRank
 
 from apps.account.models import Account
-from apps.plugin.models import Developer, OperationLog, Plugin, PluginCategory, PluginVersion, Tag
+from apps.plugin.models import Developer, OperationLog, Plugin, PluginCategory, PluginUsageRollup, PluginVersion, Tag, UsageRollup, VersionUsageRollup
 from const.error import ErrorType
-from libs.boost.parser import Argument, JsonParser
-from libs.boost.http import HttpStatus, JsonResponse, paginate_data
+from libs.boost.parser import Argument, JsonParser, ModelArgument
+from libs.boost.http import HttpStatus, JsonResponse, StreamingJsonResponse, etag_matches, make_etag, not_modified, paginate_cursor, paginate_data, valid_cursor, valid_page_size
+from apps.plugin.dto import OperationLogDTO, PluginCatalogDTO, PluginDTO, PluginListDTO, PluginVersionDetailDTO, PluginVersionListDTO, VersionCatalogDTO
+from apps.plugin.cache import catalog_cache_key, catalog_response, catalog_write, get_catalog_revision
+from apps.plugin.ingest import operation_log_buffer
+from apps.plugin import partitions
 import os
 from sts.sts import Sts
 from utils.decorators import admin_required
@@ -71,6 +83,7 @@ class PluginView(View):
     '''
         创建插件信息,新建插件必然带一个版本信息
     '''
+    @catalog_write
     def post(self, request:HttpRequest):
         plugin, error = JsonParser(
             Argument('name', data_type=str, required=True),
@@ -131,6 +144,9 @@ class PluginView(View):
                     created_user=request.account
                 )
                 pluginVersionObj.authors.set(developers)
+                pluginObj.latest_version = pluginVersionObj
+                pluginObj.save(update_fields=['latest_version'])
+                pluginObj.refresh_search_document()
             except Exception as e:
                 transaction.savepoint_rollback(savepoint_id)
                 # 事务继续，但是撤销到了savepoint_id指定的状态
@@ -138,9 +154,10 @@ class PluginView(View):
                 return JsonResponse(error_message=e)
         return JsonResponse(pluginObj.id)
     @admin_required
+    @catalog_write
     def patch(self, request:HttpRequest):
         plugin, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: Plugin.objects.filter(id=id).exists()),
+            ModelArgument('id', model=Plugin, dest='obj'),
             Argument('name', data_type=str, required=False),
             Argument('description', data_type=str, required=False),
             Argument('icon_url', data_type=str, required=False),
@@ -150,9 +167,9 @@ class PluginView(View):
         ).parse(request.body)
         if error:
             return JsonResponse(error_message=error)
-        if Plugin.objects.filter(name=plugin.name).exclude(id=plugin.id).exists() :
+        plugin_obj = plugin.obj
+        if Plugin.objects.filter(name=plugin.name).exclude(id=plugin_obj.id).exists() :
             return JsonResponse(error_message=f"插件名称{__FILED_EXISTS__}")
-        plugin_obj = Plugin.objects.filter(id=plugin.id).first()
         if plugin.name:
             plugin_obj.name = plugin.name
         if plugin.icon_url:
@@ -171,12 +188,14 @@ class PluginView(View):
             plugin_obj.user_manual = plugin.user_manual
         plugin_obj.updated_user = request.account
         plugin_obj.save()
+        plugin_obj.refresh_search_document()
         return JsonResponse()
     
     @admin_required
+    @catalog_write
     def delete(self, request:HttpRequest):
         plugin, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: Plugin.objects.filter(id=id).exists()),
+            ModelArgument('id', model=Plugin, dest='obj'),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
@@ -184,16 +203,17 @@ class PluginView(View):
             savepoint_id = transaction.savepoint()
             try:
                 # 先将子类标志为删除
-                children:PluginVersion = PluginVersion.objects.filter(plugin_id=plugin.id)
+                obj:Plugin = plugin.obj
+                children:PluginVersion = PluginVersion.objects.filter(plugin_id=obj.id)
                 for child in children:
                     child.deleted_at = timezone.now()
                     child.deleted_user = request.account
                     child.save()
-                obj:Plugin = Plugin.objects.filter(id=plugin.id).first()
                 if obj.deleted_at is not None:
                     return JsonResponse(status_code=HttpStatus.HTTP_204_NO_CONTENT)
                 obj.deleted_at = timezone.now()
                 obj.deleted_user = request.account
+                obj.latest_version = None
                 obj.save()
                 return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
        
@@ -205,11 +225,11 @@ class PluginView(View):
     #获取插件详情
     def get(self, request:HttpRequest):
         param, error = JsonParser(
-            Argument('id', data_type=int, required=True, help=f'插件ID{__FILED_REQUIRED__}', filter_func=lambda id: Plugin.objects.filter(id=id).exists()),
+            ModelArgument('id', queryset=PluginDTO.optimize(), dest='obj', help=f'插件ID{__FILED_REQUIRED__}'),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
-        pluginObj = Plugin.objects.filter(id=param.id).first()
+        pluginObj = param.obj
         # 将模型实例序列化为字典或其他格式
         plugin_dto = pluginObj.to_dto()
         # 返回JSON响应
@@ -220,42 +240,35 @@ class PluginListView(View):
     def get(self, request:HttpRequest):
         param, error = JsonParser(
             Argument('current', data_type=int, required=False),
-            Argument('page_size', data_type=int, required=False),
+            Argument('page_size', data_type=int, required=False, help='每页数量不合法', filter_func=valid_page_size),
+            Argument('cursor', data_type=str, required=False, help='分页游标不合法', filter_func=valid_cursor(Plugin)),
+            Argument('with_count', data_type=bool, required=False),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
 
-        plugins = Plugin.objects.all()
-        page_data = paginate_data(plugins, 
-                                  current=param.current if param.current != None else 1, 
-                                  page_size=param.page_size if param.page_size != None else 10, 
-                                  item_handler=lambda plugin:
-                                    {
-                                    'id':plugin.id, 
-                                    'icon_url':plugin.icon_url, 
-                                    'name': plugin.name, 
-                                    'description': plugin.description, 
-                                    'categories': [{'id':category.id, 'name':category.name, 'parent_name':category.parent.name if category.parent != None else None } for category in plugin.categories.all()],
-                                    'type':plugin.type,
-                                    'is_external':plugin.is_external,
-                                    'link':plugin.link,
-                                    'version_count':plugin.versions.count(),
-                                    'use_count': plugin.versions.annotate(log_count=Count('logs')).aggregate(use_count=models.Sum('log_count'))['use_count'],
-                                    'user_manual':plugin.user_manual
-                                    })
+        plugins = PluginListDTO.optimize(Plugin.objects.all().annotate(
+            version_count=Count('versions', filter=Q(versions__deleted_at__isnull=True)),
+        ))
+        # 传入cursor时使用游标分页，深度翻页不再产生 OFFSET 扫描
+        if param.cursor is not None:
+            page_data = paginate_cursor(plugins, param.cursor,
+                                        page_size=param.page_size if param.page_size != None else 10,
+                                        item_handler=PluginListDTO.serialize,
+                                        with_count=param.with_count == True)
+        else:
+            page_data = paginate_data(plugins,
+                                      current=param.current if param.current != None else 1,
+                                      page_size=param.page_size if param.page_size != None else 10,
+                                      item_handler=PluginListDTO.serialize)
         return JsonResponse(page_data)
 
 #获取我的已发布插件信息
 class PluginPublishListView(View):
     @admin_required
     def get(self, request:HttpRequest):
-        plugins = Plugin.objects.filter(created_user__id=request.account.id)
-        result = []
-        for item in plugins:
-            newest_version = item.versions.order_by('-id').first()
-            tags = [tag.text for tag in item.tags.all()]
-            result.append({'id':item.id, 'version_id':newest_version.id, 'version_no':newest_version.version_no, 'name':item.name, 'icon_url':item.icon_url, 'attachment_url':newest_version.attachment_url, 'attachment_size':newest_version.attachment_size, 'execution_file_path':newest_version.execution_file_path,'type':item.type,'link':item.link, 'tags': tags })
-        return JsonResponse(result)
+        plugins = PluginCatalogDTO.optimize(Plugin.objects.filter(created_user__id=request.account.id, latest_version__isnull=False))
+        return JsonResponse(PluginCatalogDTO.serialize_many(plugins))
 
 
 #插件版本信息
@@ -268,76 +281,89 @@ class PluginVersionView(View):
         (ORDER_CREATE, '最近创建'),
         (ORDER_UPDATE, '最近更新'),
     )
+    GET_PARSER = JsonParser(
+        Argument('filter', data_type=str, required=False),
+        Argument('category_id', data_type=int, required=False),
+        # , filter_func=lambda order_type: [PluginVersionView.ORDER_USE, PluginVersionView.ORDER_CREATE, PluginVersionView.ORDER_UPDATE].__contains__(order_type)
+        Argument('order', data_type=str, required=False)
+    )
     #获取插件列表
     def get(self, request:HttpRequest):
-        param, error = JsonParser(
-            Argument('filter', data_type=str, required=False),
-            Argument('category_id', data_type=int, required=False),
-            # , filter_func=lambda order_type: [PluginVersionView.ORDER_USE, PluginVersionView.ORDER_CREATE, PluginVersionView.ORDER_UPDATE].__contains__(order_type)
-            Argument('order', data_type=str, required=False)
-        ).parse(request.GET)
+        param, error = self.GET_PARSER.parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
         param.ids = request.GET.getlist('ids')
         if (param.category_id is None and param.filter is None) and (param.ids is None or len(param.ids) == 0):
             return JsonResponse(error_message=f"分类ID{__FILED_REQUIRED__}")
-        # 从所有插件开始
-        plugin_ids = Plugin.objects.all().values('id')
-        #如果直接查询插件版本列表，使用特殊逻辑返回数据
         if param.ids and len(param.ids) > 0:
             try:
-                [int(id) for id in param.ids]
+                param.ids = sorted({int(id) for id in param.ids})
             except:
                 return JsonResponse(error_message=f"存在非法或已被删除的插件版本Id")
-            plugin_versions = PluginVersion.objects.filter(id__in=param.ids)
+        if param.order and [PluginVersionView.ORDER_USE, PluginVersionView.ORDER_CREATE, PluginVersionView.ORDER_UPDATE].__contains__(param.order) == False:
+            param.order = PluginVersionView.ORDER_USE
+        # 相同查询条件在目录未发生变化前直接返回缓存结果
+        # 使用次数随操作记录累加但不更新目录版本号，按使用次数排序时缓存按 CATALOG_USE_COUNT_WINDOW 分段
+        epoch = int(time.time() // settings.CATALOG_USE_COUNT_WINDOW) if param.order == PluginVersionView.ORDER_USE else None
+        cache_key = catalog_cache_key('version', get_catalog_revision(), filter=param.filter, category_id=param.category_id, order=param.order, ids=param.ids, epoch=epoch)
+        # 目录未变化时客户端可直接使用本地结果
+        etag = make_etag(cache_key)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return catalog_response(request, cache_key, etag, lambda: self._build_catalog(param))
+
+    def _build_catalog(self, param):
+        # 从所有插件开始
+        plugin_ids = Plugin.objects.all().values('id')
+        #如果直接查询插件版本列表，使用特殊逻辑返回数据
+        if param.ids and len(param.ids) > 0:
+            plugin_versions = VersionCatalogDTO.optimize(PluginVersion.objects.filter(id__in=param.ids))
             # if len(plugin_versions) != len(param.ids):
             #     return JsonResponse(error_message=f"存在非法或已被删除的插件版本Id")
-            result = []
-            for item in plugin_versions:
-                tags = [tag.text for tag in item.plugin.tags.all()]
-                result.append({'id':item.plugin.id, 'version_id':item.id, 'version_no':item.version_no, 'name':item.plugin.name, 'icon_url':item.plugin.icon_url, 'attachment_url':item.attachment_url, 'attachment_size':item.attachment_size, 'execution_file_path':item.execution_file_path,'type':item.plugin.type,'link':item.plugin.link,'tags': tags })
-            return JsonResponse(result)
+            return VersionCatalogDTO.serialize_many(plugin_versions), None
         category_ids = None
         if param.category_id:
             if not PluginCategory.objects.filter(id=param.category_id).exists():
-                return JsonResponse(error_message=f"分类id{__FILED_NOT_EXISTS__}")
+                return None, f"分类id{__FILED_NOT_EXISTS__}"
             category_ids_query = PluginCategory.objects.filter(parent__id=param.category_id).values('id')
             category_ids = [item['id'] for item in category_ids_query]
             plugin_ids = plugin_ids.filter(categories__id__in=category_ids)
+        search_query = None
         if param.filter and len(param.filter) > 0:
-            # 插件名称, 插件描述 ,更新描述, 标签 包含搜索内容
-            plugin_ids = plugin_ids.filter(Q(name__icontains=param.filter)|Q(description__icontains=param.filter)|Q(tags__text__icontains=param.filter)|Q(versions__description__icontains=param.filter)).values('id')
-        plugins = Plugin.objects.all().filter(id__in=plugin_ids)
+            # 插件名称, 插件描述 ,更新描述, 标签 包含搜索内容，统一在冗余的搜索文档上走索引查询
+            search_query = SearchQuery(param.filter, config=Plugin.SEARCH_CONFIG)
+            plugin_ids = plugin_ids.filter(Q(search_document__contains=param.filter.lower())|Q(search_vector=search_query))
+        plugins = PluginCatalogDTO.optimize(Plugin.objects.all().filter(id__in=plugin_ids, latest_version__isnull=False))
+        if search_query is not None and not param.order:
+            # 未指定排序时按匹配程度排序
+            plugins = plugins.annotate(rank=SearchRank(F('search_vector'), search_query)).order_by('-rank', 'id')
         if param.order:
-            if [PluginVersionView.ORDER_USE, PluginVersionView.ORDER_CREATE, PluginVersionView.ORDER_UPDATE].__contains__(param.order) == False:
-                param.order = PluginVersionView.ORDER_USE
             match param.order:
                 case PluginVersionView.ORDER_USE:
-                    plugins = plugins.annotate(log_count=Count('versions__logs')).order_by('log_count')  
+                    plugins = plugins.order_by('use_count')
                 case PluginVersionView.ORDER_CREATE:
                     plugins = plugins.order_by('-created_at')
                 case PluginVersionView.ORDER_UPDATE:
-                    plugins = plugins.annotate(newest_version_id=Max('versions__id')).order_by('-newest_version_id')            
-        #怎么获取最新的插件版本 item.versions.first() 这里要特殊处理下
+                    plugins = plugins.order_by('-latest_version_id')
+        if not param.category_id:
+            return PluginCatalogDTO.serialize_many(plugins), None
+        # 按分类展开，每个插件在其所属的每个子分类下各返回一条
         result = []
-        for item in plugins:
-            newest_version = item.versions.order_by('-id').first()
-            tags = [tag.text for tag in item.tags.all()]
-            if param.category_id:
-                for category in item.categories.filter(id__in=category_ids) if category_ids != None else item.categories.all():
-                    result.append({'id':item.id, 'version_id':newest_version.id, 'version_no':newest_version.version_no, 'name':item.name, 'icon_url':item.icon_url, 'attachment_url':newest_version.attachment_url, 'attachment_size':newest_version.attachment_size, 'execution_file_path':newest_version.execution_file_path,'type':item.type, 'link':item.link,'category':category.name, 'category_id':category.id,'tags': tags })
-            else:
-                result.append({'id':item.id, 'version_id':newest_version.id, 'version_no':newest_version.version_no, 'name':item.name, 'icon_url':item.icon_url, 'attachment_url':newest_version.attachment_url, 'attachment_size':newest_version.attachment_size, 'execution_file_path':newest_version.execution_file_path,'type':item.type, 'link':item.link, 'tags': tags })
-
-        return JsonResponse(result)
+        for item in plugins.prefetch_related('categories'):
+            dto = PluginCatalogDTO.serialize(item)
+            for category in item.categories.all():
+                if category.id in category_ids:
+                    result.append({**dto, 'category':category.name, 'category_id':category.id})
+        return result, None
     
     '''
     发布新版本信息
     '''
     @admin_required
+    @catalog_write
     def post(self, request:HttpRequest):
         version, error = JsonParser(
-            Argument('app_id',  data_type=int, required=True, filter_func=lambda id: Plugin.objects.filter(id=id).exists()),
+            ModelArgument('app_id', model=Plugin, dest='plugin'),
             Argument('version_no', data_type=str, required=True),
             Argument('description', data_type=str, required=True),
             Argument('attachment_url', data_type=str, required=True, help=f"请确认文件上传完成或填写文件链接"),
@@ -347,10 +373,10 @@ class PluginVersionView(View):
         ).parse(request.body)
         if error:
             return JsonResponse(error_message=error)
-        plugin = Plugin.objects.filter(id=version.app_id).first()
+        plugin = version.plugin
         if plugin.type == Plugin.TYPE_APPLICATION and version.execution_file_path is None :
             return JsonResponse(error_message=f"应用入口{__FILED_REQUIRED__}")
-        if PluginVersion.objects.filter(Q(plugin__id=version.app_id)&Q(version_no=version.version_no)).exists() :
+        if PluginVersion.objects.filter(Q(plugin__id=plugin.id)&Q(version_no=version.version_no)).exists() :
             return JsonResponse(error_message=f"插件版本号{__FILED_EXISTS__}")
         pluginVersionObj = None
         with transaction.atomic():
@@ -372,6 +398,9 @@ class PluginVersionView(View):
                     created_user=request.account
                 )
                 pluginVersionObj.authors.set(developers)
+                plugin.latest_version = pluginVersionObj
+                plugin.save(update_fields=['latest_version'])
+                plugin.refresh_search_document()
             except Exception as e:
                 transaction.savepoint_rollback(savepoint_id)
                 # 事务继续，但是撤销到了savepoint_id指定的状态
@@ -380,9 +409,10 @@ class PluginVersionView(View):
         return JsonResponse(pluginVersionObj.id)
     
     @admin_required
+    @catalog_write
     def patch(self, request:HttpRequest):
         version, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: PluginVersion.objects.filter(id=id).exists()),
+            ModelArgument('id', model=PluginVersion, dest='obj', select_related=('plugin',)),
             Argument('version_no', data_type=str, required=True),
             Argument('description', data_type=str, required=True),
             Argument('developers', data_type=list, required=False),
@@ -394,7 +424,7 @@ class PluginVersionView(View):
         with transaction.atomic():
             savepoint_id = transaction.savepoint()
             try:
-                pluginVersionObj = PluginVersion.objects.filter(id=version.id).first()
+                pluginVersionObj = version.obj
                 pluginVersionObj.description = version.description
                 pluginVersionObj.version_no = version.version_no
 
@@ -421,6 +451,7 @@ class PluginVersionView(View):
                     pluginVersionObj.authors.set(developers)
                     
                 pluginVersionObj.save()
+                pluginVersionObj.plugin.refresh_search_document()
                 return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
     
             except Exception as e:
@@ -431,62 +462,96 @@ class PluginVersionView(View):
 
 
     @admin_required
+    @catalog_write
     def delete(self, request:HttpRequest):
         plugin_version, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: PluginVersion.objects.filter(id=id).exists()),
+            ModelArgument('id', model=PluginVersion, dest='obj', select_related=('plugin',)),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
-        obj:PluginVersion = PluginVersion.objects.filter(id=plugin_version.id).first()
+        obj:PluginVersion = plugin_version.obj
 
         if obj.deleted_at is not None:
             return JsonResponse(status_code=HttpStatus.HTTP_204_NO_CONTENT)
         if PluginVersion.objects.filter(plugin__id=obj.plugin_id).count() == 1:
             return JsonResponse(error_message=__VERSION_DELETE_REQUIRE_ERR__)
-        obj.deleted_at = timezone.now()
-        obj.deleted_user = request.account
-        obj.save()
+        with transaction.atomic():
+            obj.deleted_at = timezone.now()
+            obj.deleted_user = request.account
+            obj.save()
+            obj.plugin.refresh_latest_version()
+            obj.plugin.refresh_search_document()
         return JsonResponse(status_code=HttpStatus.HTTP_200_OK)
-        
+
+#批量解析插件版本，供客户端一次性查询已安装的插件
+class PluginVersionResolveView(View):
+    MAX_IDS = 5000
+    def post(self, request:HttpRequest):
+        form, error = JsonParser(
+            Argument('ids', data_type=list, required=True, help=f'插件版本ID{__FILED_REQUIRED__}',
+                     filter_func=lambda ids: 0 < len(ids) <= PluginVersionResolveView.MAX_IDS and all(isinstance(id, int) and not isinstance(id, bool) for id in ids)),
+        ).parse(request.body)
+        if error:
+            return JsonResponse(error_message=error)
+        ids = set(form.ids)
+        # 包含已删除的版本一起查询，以便区分不存在与已删除
+        versions = VersionCatalogDTO.optimize(PluginVersion.all_objects.filter(id__in=ids)).annotate(
+            is_deleted=ExpressionWrapper(Q(deleted_at__isnull=False) | Q(plugin__deleted_at__isnull=False), output_field=models.BooleanField()))
+        result, deleted_ids = [], []
+        for version in versions:
+            if version.is_deleted:
+                deleted_ids.append(version.id)
+            else:
+                result.append(VersionCatalogDTO.serialize(version))
+        unknown_ids = ids.difference(item['version_id'] for item in result).difference(deleted_ids)
+        return JsonResponse({
+            'list': result,
+            'deleted_ids': sorted(deleted_ids),
+            'unknown_ids': sorted(unknown_ids),
+        })
+
 #插件版本信息
 class PluginVersionListView(View):
     @admin_required
     def get(self, request:HttpRequest):
         param, error = JsonParser(
             Argument('current', data_type=int, required=False),
-            Argument('page_size', data_type=int, required=False),
+            Argument('page_size', data_type=int, required=False, help='每页数量不合法', filter_func=valid_page_size),
+            Argument('cursor', data_type=str, required=False, help='分页游标不合法', filter_func=valid_cursor(PluginVersion)),
+            Argument('with_count', data_type=bool, required=False),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
         # 从所有插件开始
-        pluginVersions = PluginVersion.objects.all()
-        page_data = paginate_data(pluginVersions, 
-                                  current=param.current if param.current != None else 1, 
-                                  page_size=param.page_size if param.page_size != None else 10, 
-                                  item_handler=lambda pluginVersion:
-                                    {
-                                    'id':pluginVersion.id, 
-                                    'plugin_id':pluginVersion.plugin.id, 
-                                    'plugin_name':pluginVersion.plugin.name, 
-                                    'version_no': pluginVersion.version_no, 
-                                    'description':pluginVersion.description,
-                                    'publish_date':pluginVersion.publish_date,
-                                    'developers': [{'id': author.id, 'name': author.name, 'email': author.email, 'phone': author.phone} for author in pluginVersion.authors.all()],
-                                    'use_count': pluginVersion.logs.count()
-                                    })
+        pluginVersions = PluginVersionListDTO.optimize(PluginVersion.objects.all())
+        if param.cursor is not None:
+            page_data = paginate_cursor(pluginVersions, param.cursor,
+                                        page_size=param.page_size if param.page_size != None else 10,
+                                        item_handler=PluginVersionListDTO.serialize,
+                                        with_count=param.with_count == True)
+        else:
+            page_data = paginate_data(pluginVersions,
+                                      current=param.current if param.current != None else 1,
+                                      page_size=param.page_size if param.page_size != None else 10,
+                                      item_handler=PluginVersionListDTO.serialize)
         return JsonResponse(page_data)
 
 #插件分类信息接口
 class PluginCategoryView(View):
     def get(self, request:HttpRequest):
+        revision = get_catalog_revision()
+        etag = make_etag('category', revision)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         try:
-            categories = list(PluginCategory.objects.filter(parent=None))
-            categorized_data = self._build_category_tree(categories)
-            return JsonResponse(categorized_data)
+            # 分类树在分类发生写操作前保持不变，直接使用缓存
+            cache_key = catalog_cache_key('category', revision)
+            return catalog_response(request, cache_key, etag, lambda: (self._build_category_tree(), None))
         except Exception as e:
             loguru.logger.error(f"生成插件类别失败: {e}")
             return JsonResponse(error_message='获取插件分类失败')
     @admin_required
+    @catalog_write
     def post(self, request:HttpRequest):
         form, error = JsonParser(
             Argument('name', data_type=str, required=True),
@@ -510,22 +575,24 @@ class PluginCategoryView(View):
         return JsonResponse(category.id)
  
     @admin_required
+    @catalog_write
     def patch(self, request:HttpRequest):
         form, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: PluginCategory.objects.filter(id=id).exists()),
+            ModelArgument('id', model=PluginCategory, dest='obj'),
             Argument('name', data_type=str, required=True),
         ).parse(request.body)
         if error:
             return JsonResponse(error_message=error)
-        plugin = PluginCategory.objects.filter(id=form.id).first()
-        if (plugin.parent_id != None and PluginCategory.objects.filter(name=form.name, parent__id=plugin.parent_id).exclude(id=form.id).exists()) or (plugin.parent_id == None and PluginCategory.objects.filter(name=form.name).exclude(id=form.id).exists()):
+        plugin = form.obj
+        if (plugin.parent_id != None and PluginCategory.objects.filter(name=form.name, parent__id=plugin.parent_id).exclude(id=plugin.id).exists()) or (plugin.parent_id == None and PluginCategory.objects.filter(name=form.name).exclude(id=plugin.id).exists()):
             return JsonResponse(error_message=f'分类名称:({form.name}){__FILED_EXISTS__}')
-        return JsonResponse(PluginCategory.objects.filter(id=form.id).update(name=form.name))
+        return JsonResponse(PluginCategory.objects.filter(id=plugin.id).update(name=form.name))
     
     @admin_required
+    @catalog_write
     def delete(self, request:HttpRequest):
         request_obj, error = JsonParser(
-            Argument('id', data_type=int, required=True, filter_func=lambda id: PluginCategory.objects.filter(id=id).exists()),
+            ModelArgument('id', model=PluginCategory, dest='obj'),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
@@ -533,12 +600,12 @@ class PluginCategoryView(View):
         with transaction.atomic():
             savepoint_id = transaction.savepoint()
             try:
-                children:PluginCategory = PluginCategory.objects.filter(parent__id=request_obj.id)
+                obj:PluginCategory = request_obj.obj
+                children:PluginCategory = PluginCategory.objects.filter(parent__id=obj.id)
                 for child in children:
                     child.deleted_at = timezone.now()
                     child.deleted_user = request.account
                     child.save()
-                obj:PluginCategory = PluginCategory.objects.filter(id=request_obj.id).first()
 
                 if obj.deleted_at is not None:
                     return JsonResponse(status_code=HttpStatus.HTTP_204_NO_CONTENT)
@@ -553,16 +620,14 @@ class PluginCategoryView(View):
                 loguru.logger.error(f"删除失败: {e}")
                 return JsonResponse(error_message=e)
  
-    #构建插件分类的树状结构
-    def _build_category_tree(self, categories):
-        tree = []
-        for category in categories:
-            tree.append({
-                'id': category.id,
-                'name': category.name,
-                'children': self._build_category_tree(category.children.all())
-            })
-        return tree
+    #构建插件分类的树状结构，一次查询取出全部分类后在内存中组装
+    def _build_category_tree(self):
+        children = defaultdict(list)
+        for id, name, parent_id in PluginCategory.objects.values_list('id', 'name', 'parent_id'):
+            children[parent_id].append((id, name))
+        def build(parent_id):
+            return [{'id': id, 'name': name, 'children': build(id)} for id, name in children[parent_id]]
+        return build(None)
 
 #插件分类列表
 class PluginCategoryListView(View):
@@ -573,27 +638,30 @@ class PluginCategoryListView(View):
         param, error = JsonParser(
             Argument('view', data_type=str, required=True, help=f'视图模型{__FILED_REQUIRED__}', filter_func=lambda name: [self.VIEW_MAIN, self.VIEW_SECOND].__contains__(name)),
             Argument('current', data_type=int, required=False),
-            Argument('page_size', data_type=int, required=False),
+            Argument('page_size', data_type=int, required=False, help='每页数量不合法', filter_func=valid_page_size),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
         try:
             if param.view == self.VIEW_MAIN:
-                categories = list(PluginCategory.objects.filter(parent=None))
-                page_data = paginate_data(categories, 
-                                          current=param.current if param.current != None else 1, 
-                                          page_size=param.page_size if param.page_size != None else 10, 
-                                          item_handler=lambda category:
-                                          {'id':category.id, 'name':category.name, 'children_count': category.children.count(), 'app_count': category.children.aggregate(appcount=models.Count('plugin_category'))['appcount'] } )
-                return JsonResponse(page_data)
+                # 子分类数量及子分类下去重后的插件数量以子查询的方式下推到数据库，每页查询次数固定
+                children_count = PluginCategory.objects.filter(parent=OuterRef('pk')).order_by().values('parent').annotate(count=Count('id')).values('count')
+                app_count = Plugin.objects.filter(categories__parent=OuterRef('pk'), categories__deleted_at__isnull=True).order_by() \
+                    .values('categories__parent').annotate(count=Count('id', distinct=True)).values('count')
+                categories = PluginCategory.objects.filter(parent=None).annotate(
+                    children_count=Coalesce(Subquery(children_count), 0),
+                    app_count=Coalesce(Subquery(app_count), 0),
+                ).values('id', 'name', 'children_count', 'app_count')
             else:
-                categories = list(PluginCategory.objects.filter(parent__isnull=False))
-                page_data = paginate_data(categories, 
-                                          current=param.current if param.current != None else 1, 
-                                          page_size=param.page_size if param.page_size != None else 10, 
-                                          item_handler=lambda category:
-                                          {'id':category.id, 'name':category.name, 'parent_name':category.parent.name, 'app_count': category.plugin_category.count() })
-                return JsonResponse(page_data)
+                app_count = Plugin.objects.filter(categories=OuterRef('pk')).order_by().values('categories').annotate(count=Count('id', distinct=True)).values('count')
+                categories = PluginCategory.objects.filter(parent__isnull=False).annotate(
+                    parent_name=F('parent__name'),
+                    app_count=Coalesce(Subquery(app_count), 0),
+                ).values('id', 'name', 'parent_name', 'app_count')
+            page_data = paginate_data(categories,
+                                      current=param.current if param.current != None else 1,
+                                      page_size=param.page_size if param.page_size != None else 10)
+            return JsonResponse(page_data)
         except Exception as e:
             loguru.logger.error(f"获取插件分类失败: {e}")
             return JsonResponse(error_message='获取插件分类失败')
@@ -602,56 +670,235 @@ class PluginCategoryListView(View):
 class PluginVersionDetailView(View):
     def get(self, request:HttpRequest):
         param, error = JsonParser(
-            Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}', filter_func=lambda id: PluginVersion.objects.filter(id=id).exists()),
+            ModelArgument('version_id', queryset=PluginVersionDetailDTO.optimize(), dest='obj', help=f'插件版本ID{__FILED_REQUIRED__}'),
         ).parse(request.GET)
         if error:
             return JsonResponse(error_message=error)
-        pluginVersionObj = PluginVersion.objects.filter(id=param.version_id).first()
+        pluginVersionObj = param.obj
         # 将模型实例序列化为字典或其他格式
-        plugin_dto = {
-            'id': pluginVersionObj.id,
-            'plugin_id': pluginVersionObj.plugin.id,
-            'user_manual': pluginVersionObj.plugin.user_manual,
-            'icon_url': pluginVersionObj.plugin.icon_url,
-            'plugin_type': pluginVersionObj.plugin.type,
-            'version_no': pluginVersionObj.version_no,
-            'versions':[{ 'id': item.id, 'version_no': item.version_no } for item in pluginVersionObj.plugin.versions.all()],
-            'name': pluginVersionObj.plugin.name, 
-            'is_external': pluginVersionObj.plugin.is_external, 
-            'description':pluginVersionObj.plugin.description,
-            'update_description':pluginVersionObj.description,
-            'link':pluginVersionObj.plugin.link,
-            'update_description':pluginVersionObj.description,
-            'attachment_url':pluginVersionObj.attachment_url,
-            'attachment_size':pluginVersionObj.attachment_size,
-            'execution_file_path':pluginVersionObj.execution_file_path,
-            'publish_date':pluginVersionObj.publish_date,
-            'tags':[item.text for item in pluginVersionObj.plugin.tags.all()],
-            'authors':[{'name':item.name, 'phone':item.phone,'email':item.email} for item in pluginVersionObj.authors.all()],
-        }
+        plugin_dto = PluginVersionDetailDTO.serialize(pluginVersionObj)
         # 返回JSON响应
         return JsonResponse(plugin_dto)
+def parse_date_argument(value: str) -> bool:
+    try:
+        return parse_date(value) is not None
+    except ValueError:
+        return False
+
+
+def local_midnight(day: datetime.date) -> datetime.datetime:
+    """TIME_ZONE 中该日的零点"""
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=timezone.get_current_timezone())
+
+
+# 可上报的操作类型，单条及批量上报一致
+LOG_TYPES = (OperationLog.TYPE_OPEN, OperationLog.TYPE_INSTALL, OperationLog.TYPE_RUN)
+
+
 #操作记录
 class OperationLogView(View):
+    POST_PARSER = JsonParser(
+        Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}'),
+        Argument('type', data_type=int, required=True, help='操作类型不合法', filter_func=lambda type: type in LOG_TYPES),
+    )
+    GET_PARSER = JsonParser(
+        Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}'),
+        Argument('type', data_type=int, required=False, help='操作类型不合法',
+                 filter_func=lambda type: type in LOG_TYPES),
+        Argument('start', data_type=str, required=False, help='开始日期不合法', filter_func=parse_date_argument, handler_func=parse_date),
+        Argument('end', data_type=str, required=False, help='结束日期不合法', filter_func=parse_date_argument, handler_func=parse_date),
+        Argument('page_size', data_type=int, required=False, help='每页数量不合法', filter_func=valid_page_size),
+        Argument('cursor', data_type=str, required=False, help='分页游标不合法', filter_func=valid_cursor(OperationLog, '-occurred_at')),
+        Argument('with_count', data_type=bool, required=False),
+        Argument('export', data_type=bool, required=False),
+    )
     def post(self, request:HttpRequest):
-        form, error = JsonParser(
-            Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}'),
-            Argument('type', data_type=int, required=True, filter_func=lambda type: [OperationLog.TYPE_OPEN, OperationLog.TYPE_OPEN , OperationLog.TYPE_INSTALL].__contains__(type)),
-        ).parse(request.body)
+        """
+        上报一条操作记录，写入当前 worker 的缓冲区，由缓冲区批量写入数据库
+        写入前没有操作记录ID，返回值与批量上报一致
+
+        Returns:
+            JsonResponse: accepted 为接收的数量，版本不存在时返回404
+        """
+        form, error = self.POST_PARSER.parse(request.body)
         if error:
             return JsonResponse(error_message=error)
-        version = get_object_or_404(PluginVersion, id=form.version_id)
-        log = OperationLog.objects.create(
-            version=version,
-            type=form.type,
-            created_user=request.account
-        )
-        return JsonResponse(log.id)
+        if not operation_log_buffer.add(form.version_id, form.type, request.account.id):
+            raise Http404('插件版本不存在')
+        return JsonResponse({'accepted': 1})
     def get(self, request:HttpRequest):
-        form, error = JsonParser(
-            Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}'),
-        ).parse(request.GET)
-        logs = OperationLog.objects.filter(version__id=form.version_id)
-        return JsonResponse([{'id':log.id,'plugin_name':log.version.plugin.name, 'version_no':log.version.version_no, 'type': log.type, 'created_at':log.created_at } for log in logs])
+        form, error = self.GET_PARSER.parse(request.GET)
+        if error:
+            return JsonResponse(error_message=error)
+        logs = OperationLog.objects.filter(version_id=form.version_id)
+        if form.type is not None:
+            logs = logs.filter(type=form.type)
+        # 日期按 TIME_ZONE 计算，结束日期包含当天；按 occurred_at 过滤只扫描相关的月份分区
+        if form.start is not None:
+            logs = logs.filter(occurred_at__gte=local_midnight(form.start))
+        if form.end is not None:
+            logs = logs.filter(occurred_at__lt=local_midnight(form.end + timedelta(days=1)))
+        # 插件名称、版本号通过关联查询一次取出
+        logs = OperationLogDTO.optimize(logs)
+        if form.export:
+            # 导出时流式返回全部数据，不在内存中组装
+            return StreamingJsonResponse(logs.order_by('-occurred_at', '-id').iterator(chunk_size=500), item_handler=OperationLogDTO.serialize)
+        page_data = paginate_cursor(logs, form.cursor,
+                                    page_size=form.page_size if form.page_size is not None else 20,
+                                    ordering='-occurred_at',
+                                    item_handler=OperationLogDTO.serialize,
+                                    with_count=form.with_count == True)
+        return JsonResponse(page_data)
+
+
+def parse_occurred_at(value: str):
+    """解析客户端上报的 ISO 8601 时间，未带时区时按服务端时区处理，格式不合法时返回None"""
+    try:
+        occurred_at = parse_datetime(value)
+    except ValueError:
+        return None
+    if occurred_at is not None and timezone.is_naive(occurred_at):
+        occurred_at = timezone.make_aware(occurred_at)
+    return occurred_at
+
+
+#操作记录批量上报，离线或繁忙的客户端一次提交多条记录
+class OperationLogBatchView(View):
+    MAX_EVENTS = 1000
+    # 允许客户端时钟超前的时间
+    MAX_CLOCK_SKEW = timedelta(minutes=5)
+    POST_PARSER = JsonParser(
+        Argument('events', data_type=list, required=True, help=f'操作记录{__FILED_REQUIRED__}',
+                 filter_func=lambda events: 0 < len(events) <= OperationLogBatchView.MAX_EVENTS),
+    )
+    EVENT_PARSER = JsonParser(
+        Argument('version_id', data_type=int, required=True, help=f'插件版本ID{__FILED_REQUIRED__}'),
+        Argument('type', data_type=int, required=True, help='操作类型不合法',
+                 filter_func=lambda type: type in LOG_TYPES),
+        Argument('occurred_at', data_type=str, required=False, help='发生时间不合法', filter_func=lambda value: parse_occurred_at(value) is not None),
+    )
+    def post(self, request:HttpRequest):
+        """
+        批量上报操作记录，单次最多 MAX_EVENTS 条
+        所有版本ID通过一次查询校验，有效记录通过一条语句写入
+        发生时间需在保留期（OPERATION_LOG_RETENTION_MONTHS）内，且不晚于当前时间 MAX_CLOCK_SKEW
+
+        Returns:
+            JsonResponse: accepted/rejected 为写入及拒绝的数量，results 与提交的记录一一对应
+        """
+        form, error = self.POST_PARSER.parse(request.body)
+        if error:
+            return JsonResponse(error_message=error)
+        now = timezone.now()
+        # 早于保留期的记录所在分区已分离或即将分离，不再接收
+        earliest = local_midnight(partitions.retention_start())
+        events, results = [], []
+        for item in form.events:
+            if not isinstance(item, dict):
+                event, error = None, '操作记录格式不合法'
+            else:
+                event, error = self.EVENT_PARSER.parse(item)
+            if event is not None:
+                event.occurred_at = parse_occurred_at(event.occurred_at) if event.occurred_at else now
+                if not earliest <= event.occurred_at <= now + self.MAX_CLOCK_SKEW:
+                    event, error = None, '发生时间不合法'
+            events.append(event)
+            results.append({'success': event is not None, 'error_message': error})
+        version_ids = {event.version_id for event in events if event is not None}
+        versions = dict(PluginVersion.objects.filter(id__in=version_ids).values_list('id', 'plugin_id')) if version_ids else {}
+        logs, counts = [], defaultdict(int)
+        for index, event in enumerate(events):
+            if event is None:
+                continue
+            plugin_id = versions.get(event.version_id)
+            if plugin_id is None:
+                results[index] = {'success': False, 'error_message': '插件版本不存在'}
+                continue
+            logs.append(OperationLog(version_id=event.version_id, type=event.type, occurred_at=event.occurred_at, created_user_id=request.account.id))
+            counts[(event.version_id, plugin_id)] += 1
+        if logs:
+            with transaction.atomic():
+                OperationLog.objects.bulk_create(logs)
+                for (version_id, plugin_id), count in counts.items():
+                    PluginVersion.increase_use_count(version_id, plugin_id, count)
+        return JsonResponse({
+            'accepted': len(logs),
+            'rejected': len(results) - len(logs),
+            'results': results,
+        })
+
+
+# 使用统计的公共参数
+USAGE_ARGUMENTS = (
+    Argument('period', data_type=str, required=False, help='统计周期不合法',
+             filter_func=lambda period: period in (UsageRollup.PERIOD_DAY, UsageRollup.PERIOD_WEEK)),
+    Argument('start', data_type=str, required=True, help='开始日期不合法', filter_func=parse_date_argument, handler_func=parse_date),
+    Argument('end', data_type=str, required=True, help='结束日期不合法', filter_func=parse_date_argument, handler_func=parse_date),
+)
+# 单次查询最多返回的统计周期数
+MAX_USAGE_POINTS = 400
+
+
+def usage_series(queryset, period: str, start, end):
+    """从汇总表读取 [start, end] 日期内的使用统计，缺少汇总行的周期补0
+
+    Returns:
+        tuple: (result, error)
+    """
+    period = period or UsageRollup.PERIOD_DAY
+    if start > end:
+        return None, '开始日期不能晚于结束日期'
+    first, last = UsageRollup.period_range(period, start, end + timedelta(days=1))
+    step = timedelta(days=7 if period == UsageRollup.PERIOD_WEEK else 1)
+    if (last - first) / step > MAX_USAGE_POINTS:
+        return None, f'单次最多查询{MAX_USAGE_POINTS}个统计周期'
+    rows = {row['start']: row for row in queryset.filter(period=period, start__gte=first, start__lt=last)
+            .values('start', 'opens', 'installs', 'runs', 'users')}
+    series, day = [], first
+    while day < last:
+        series.append(rows.get(day) or {'start': day, 'opens': 0, 'installs': 0, 'runs': 0, 'users': 0})
+        day += step
+    return {
+        'period': period,
+        'start': first,
+        'end': last - timedelta(days=1),
+        'series': series,
+        # 操作人数按周期去重，跨周期不能累加
+        'total': {key: sum(item[key] for item in series) for key in ('opens', 'installs', 'runs')},
+    }, None
+
+
+#插件使用统计，包含所有版本
+class PluginUsageView(View):
+    GET_PARSER = JsonParser(
+        ModelArgument('plugin_id', queryset=Plugin.objects.only('id', 'name'), dest='plugin', help=f'插件ID{__FILED_REQUIRED__}'),
+        *USAGE_ARGUMENTS,
+    )
+    @admin_required
+    def get(self, request:HttpRequest):
+        form, error = self.GET_PARSER.parse(request.GET)
+        if error:
+            return JsonResponse(error_message=error)
+        result, error = usage_series(PluginUsageRollup.objects.filter(plugin=form.plugin), form.period, form.start, form.end)
+        if error:
+            return JsonResponse(error_message=error)
+        return JsonResponse({'plugin_id': form.plugin.id, 'name': form.plugin.name, **result})
+
+
+#插件版本使用统计
+class PluginVersionUsageView(View):
+    GET_PARSER = JsonParser(
+        ModelArgument('version_id', queryset=PluginVersion.objects.only('id', 'plugin_id', 'version_no'), dest='version', help=f'插件版本ID{__FILED_REQUIRED__}'),
+        *USAGE_ARGUMENTS,
+    )
+    @admin_required
+    def get(self, request:HttpRequest):
+        form, error = self.GET_PARSER.parse(request.GET)
+        if error:
+            return JsonResponse(error_message=error)
+        result, error = usage_series(VersionUsageRollup.objects.filter(version=form.version), form.period, form.start, form.end)
+        if error:
+            return JsonResponse(error_message=error)
+        return JsonResponse({'version_id': form.version.id, 'plugin_id': form.version.plugin_id, 'version_no': form.version.version_no, **result})
     
  
\ No newline at end of file
@@ -41,9 +41,13 @@ def pre_fork(server, worker):
 
 def post_worker_init(worker):
     """在每个工作进程退出时执行一次的可选 Python 函数"""
-    pass
+    # 应用加载完成后才能导入 django 模块
+    from apps.plugin.ingest import operation_log_buffer
+    operation_log_buffer.start()
 
 
 def worker_exit(server, worker):
     """每当工人完成其所有请求并关闭其连接时，都会调用此函数"""
-    pass
+    # 写入缓冲区中剩余的操作记录
+    from apps.plugin.ingest import operation_log_buffer
+    operation_log_buffer.stop()
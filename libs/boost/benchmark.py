@@ -0,0 +1,113 @@
+"""键名转换及json序列化性能测试
+
+对比每次编译正则的旧实现与缓存键名转换后的 camelize / underscoreize，
+以及标准库 json 与 orjson 后端（含输出一致性检查）的序列化耗时，
+测试数据模拟插件目录接口的返回内容。
+
+运行方式:
+    python -m libs.boost.benchmark
+"""
+import re
+import timeit
+
+from . import json_backend
+from .utils import camelize, camelize_key, underscoreize, underscoreize_key, underscore_to_camel
+
+CATALOG_SIZE = 500
+REPEAT = 20
+
+
+def legacy_camelize(data):
+    """旧实现，每个键名都重新编译正则"""
+    if isinstance(data, dict):
+        new_dict = {}
+        for key, value in data.items():
+            if isinstance(key, str) and "_" in key:
+                camelize_re = re.compile(r"[a-zA-Z0-9]?_[a-zA-Z0-9]")
+                key = re.sub(camelize_re, underscore_to_camel, key)
+            new_dict[key] = legacy_camelize(value)
+        return new_dict
+    if isinstance(data, list):
+        return [legacy_camelize(item) for item in data]
+    return data
+
+
+def legacy_underscoreize(data):
+    """旧实现，每个键名都重新编译正则"""
+    if isinstance(data, dict):
+        new_dict = {}
+        for key, value in data.items():
+            pattern = (r"([a-z0-9]|[A-Z]?(?=[A-Z0-9](?=[a-z0-9]|(?<![A-Z])$)))([A-Z]|(?<=[a-z])[0-9]"
+                       r"(?=[0-9A-Z]|$)|(?<=[A-Z])[0-9](?=[0-9]|$))")
+            key = re.compile(pattern).sub(r"\1_\2", key).lower().lstrip("_")
+            new_dict[key] = legacy_underscoreize(value)
+        return new_dict
+    if isinstance(data, list):
+        return [legacy_underscoreize(item) for item in data]
+    return data
+
+
+def catalog_payload(size: int = CATALOG_SIZE) -> dict:
+    """生成与插件目录接口结构一致的返回数据"""
+    return {
+        'data': [{
+            'id': index,
+            'version_id': index,
+            'version_no': '1.0.0',
+            'name': f'插件{index}',
+            'icon_url': 'https://example.com/icon.png',
+            'attachment_url': 'https://example.com/plugin.zip',
+            'attachment_size': 1024,
+            'execution_file_path': 'bin/plugin.exe',
+            'type': 1,
+            'link': None,
+            'tags': ['幕墙', '结构'],
+            'category': '建筑通用',
+            'category_id': 2,
+        } for index in range(size)],
+        'status_code': 200,
+        'error_type': None,
+        'error_code': None,
+        'error_message': None,
+        'show_type': 0,
+        'success': True,
+        'host': 'localhost',
+    }
+
+
+def measure(func, payload) -> float:
+    return min(timeit.repeat(lambda: func(payload), number=1, repeat=REPEAT))
+
+
+def main():
+    payload = catalog_payload()
+    camel_payload = camelize(payload)
+    assert legacy_camelize(payload) == camel_payload
+    assert legacy_underscoreize(camel_payload) == underscoreize(camel_payload)
+    camelize_key.cache_clear()
+    underscoreize_key.cache_clear()
+    for name, legacy, cached, data in (
+        ('camelize', legacy_camelize, camelize, payload),
+        ('underscoreize', legacy_underscoreize, underscoreize, camel_payload),
+    ):
+        legacy_time = measure(legacy, data)
+        cached_time = measure(cached, data)
+        print(f'{name:<14} {CATALOG_SIZE} 条: 旧实现 {legacy_time * 1000:.2f}ms, 缓存 {cached_time * 1000:.2f}ms, 提升 {legacy_time / cached_time:.1f}x')
+    for name, func in (('camelize_key', camelize_key), ('underscoreize_key', underscoreize_key)):
+        info = func.cache_info()
+        print(f'{name:<18} 命中率 {info.hits / (info.hits + info.misses):.2%} ({info.currsize} 个键名)')
+    backend = json_backend.get_backend()
+    try:
+        json_backend.use_backend('json')
+        json_time = measure(json_backend.dumps, camel_payload)
+        json_backend.use_backend('orjson')
+        orjson_time = measure(json_backend.dumps, camel_payload)
+        print(f'{"dumps":<14} {CATALOG_SIZE} 条: json {json_time * 1000:.2f}ms, orjson {orjson_time * 1000:.2f}ms, 提升 {json_time / orjson_time:.1f}x')
+    except KeyError:
+        print('未安装 orjson，跳过序列化测试')
+    finally:
+        json_backend.use_backend(backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""响应压缩
+
+根据请求头 Accept-Encoding 协商压缩算法，支持 gzip，安装了 brotli 时优先使用 br。
+CompressionMiddleware 对普通响应及流式响应进行压缩，内容固定的响应（如目录缓存）
+可以通过 compress 预先压缩后缓存，使用 PrecompressedResponse 直接返回。
+"""
+import gzip
+import zlib
+from typing import Iterable, Iterator
+from django.http import HttpResponse as DjangoHttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_BR = 'br'
+ENCODING_GZIP = 'gzip'
+
+# 同等权重时按顺序优先选择
+ENCODINGS = (ENCODING_BR, ENCODING_GZIP) if brotli is not None else (ENCODING_GZIP,)
+
+# 实时压缩使用较快的压缩级别，预压缩的内容只压缩一次，使用最高压缩级别
+GZIP_LEVEL = 6
+GZIP_LEVEL_BEST = 9
+BROTLI_QUALITY = 5
+BROTLI_QUALITY_BEST = 11
+
+
+def negotiate_encoding(request) -> str | None:
+    """根据 Accept-Encoding 选择压缩算法，不支持压缩时返回None"""
+    header = request.headers.get('Accept-Encoding')
+    if not header:
+        return None
+    weights = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = weight
+    candidates = []
+    for index, encoding in enumerate(ENCODINGS):
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > 0:
+            candidates.append((-weight, index, encoding))
+    return min(candidates)[2] if candidates else None
+
+
+def compress(content: bytes, encoding: str, best: bool = False) -> bytes:
+    """压缩内容
+
+    Args:
+        content (bytes): 需要压缩的内容
+        encoding (str): 压缩算法
+        best (bool, optional): 是否使用最高压缩级别. Defaults to False.
+    """
+    if encoding == ENCODING_BR:
+        return brotli.compress(content, quality=BROTLI_QUALITY_BEST if best else BROTLI_QUALITY)
+    # mtime 固定为0，相同内容压缩结果一致
+    return gzip.compress(content, compresslevel=GZIP_LEVEL_BEST if best else GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(sequence: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """逐块压缩流式内容"""
+    if encoding == ENCODING_BR:
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in sequence:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    # wbits 31 输出 gzip 格式
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in sequence:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def weak_etag(etag: str) -> str:
+    """压缩后的内容与原内容字节不同，ETag 转为弱校验"""
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+class PrecompressedResponse(DjangoHttpResponse):
+    """返回已压缩的Json内容，内容在压缩前已完成驼峰转换"""
+    camelized = True
+    success = True
+
+    def __init__(self, content: bytes, encoding: str, etag: str = None):
+        super().__init__(content=content, content_type='application/json')
+        self['Content-Encoding'] = encoding
+        self['Content-Length'] = str(len(content))
+        patch_vary_headers(self, ('Accept-Encoding',))
+        if etag:
+            self['ETag'] = weak_etag(etag)
@@ -1,5 +1,6 @@
 import arrow
 import json
+import uuid
 from datetime import datetime, date as datetime_date
 from decimal import Decimal
 from enum import Enum
@@ -22,7 +23,7 @@ class AttrDict(dict):
 
 
 class JsonEncoder(json.JSONEncoder):
-    """拓展json模块，支持datetime、arrow、decimal、Enum等类型
+    """拓展json模块，支持datetime、arrow、decimal、Enum、UUID等类型
     """
     def default(self, o):
         if isinstance(o, arrow.Arrow):
@@ -36,4 +37,6 @@ class JsonEncoder(json.JSONEncoder):
     
         elif isinstance(o, Enum):
             return o.value
+        elif isinstance(o, uuid.UUID):
+            return str(o)
 
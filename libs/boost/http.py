@@ -1,13 +1,18 @@
+import base64
+import hashlib
 import json
 import socket
-from django.http import HttpResponse as DjangoHttpResponse
-from django.db.models import QuerySet
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse as DjangoHttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.db.models import Model, Q, QuerySet
 from django.core.paginator import Paginator
-from dataclasses import dataclass, field
-from typing import Any, Callable, Dict
+from dataclasses import InitVar, dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
 from enum import Enum
 from .error import ErrorType, ShowType
-from .extend import JsonEncoder
+from . import json_backend
+from .utils import camelize
 
 
 class HttpStatus(Enum):
@@ -101,9 +106,20 @@ class HttpStatus(Enum):
         return 500 <= code <= 599
 
 
+# 主机名在进程内不会变化，只获取一次
+HOSTNAME = socket.gethostname()
+
+# 错误响应体缓存，key 为 (错误类型, 状态码, 显示类型, 主机名)
+_ERROR_BODIES: Dict[Tuple, bytes] = {}
+
+
 @dataclass
 class JsonResponse(DjangoHttpResponse):
-    """自定义格式Json Response"""
+    """自定义格式Json Response
+
+    序列化时直接输出驼峰格式的键名，CamelToSnakeMiddleware 不再对响应体进行处理。
+    指定 error_type 的错误响应内容固定，响应体编码一次后缓存复用。
+    """
     data: Any = None
     status_code: HttpStatus = HttpStatus.HTTP_200_OK
     error_type: ErrorType | None = None
@@ -111,9 +127,11 @@ class JsonResponse(DjangoHttpResponse):
     error_message: str | None = None
     show_type: ShowType | None = ShowType.SILENT
     success: bool = field(init=False, default=True)
-    host: str = field(default_factory=lambda: socket.gethostname())
+    host: str = HOSTNAME
+    etag: InitVar[str | None] = None
+    camelized = True
 
-    def __post_init__(self):
+    def __post_init__(self, etag):
         self.success = True
         if any([self.error_type, self.error_message]):
             self.success = False
@@ -128,14 +146,116 @@ class JsonResponse(DjangoHttpResponse):
         """自动解析查询结果"""
         if hasattr(self.data, 'to_dict'):
             self.data = self.data.to_dict()
-        elif isinstance(self.data, (list, QuerySet)) and all([hasattr(item, 'to_dict') for item in self.data]):
+        elif isinstance(self.data, (list, QuerySet)) and all(hasattr(item, 'to_dict') for item in self.data):
             self.data = [item.to_dict() for item in self.data]
 
+        status = self.status_code.value if isinstance(self.status_code, HttpStatus) else self.status_code
+        if self.error_type:
+            key = (self.error_type, status, self.show_type, self.host)
+            content = _ERROR_BODIES.get(key)
+            if content is None:
+                content = _ERROR_BODIES[key] = self._render(status)
+        else:
+            content = self._render(status)
+        super().__init__(content=content, content_type='application/json', status=status)
+        if etag:
+            self['ETag'] = etag
+
+    def _render(self, status: int) -> bytes:
+        # 信封的键名直接使用驼峰格式，只对 data 做转换
+        return json_backend.dumps({
+            'data': camelize(self.data),
+            'statusCode': status,
+            'errorType': self.error_type,
+            'errorCode': self.error_code,
+            'errorMessage': self.error_message,
+            'showType': self.show_type,
+            'success': self.success,
+            'host': self.host,
+        }).encode('utf-8')
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """流式Json Response
+
+    响应结构与 JsonResponse 一致，data 为可迭代对象（如 queryset.iterator()），
+    按批次逐条序列化输出，整个列表无需一次性加载到内存。
+    键名在输出时即已转换为驼峰格式，CamelToSnakeMiddleware 不再对响应体进行处理。
+
+    Args:
+        data (Iterable): 需要输出的数据
+        item_handler (Callable, optional): 对每条数据进行处理的函数. Defaults to None.
+        status_code (HttpStatus, optional): 响应状态码. Defaults to HttpStatus.HTTP_200_OK.
+        etag (str, optional): 响应ETag. Defaults to None.
+        chunk_size (int, optional): 每次输出的数据条数. Defaults to 100.
+    """
+    camelized = True
+    success = True
+
+    def __init__(self, data: Iterable, item_handler: Callable = None, status_code: HttpStatus = HttpStatus.HTTP_200_OK, etag: str = None, chunk_size: int = 100):
+        self.host = HOSTNAME
+        status = status_code.value if isinstance(status_code, HttpStatus) else status_code
         super().__init__(
-            content=json.dumps(vars(self), cls=JsonEncoder, ensure_ascii=False),
+            streaming_content=self._stream(data, item_handler, status, chunk_size),
             content_type='application/json',
-            status=self.status_code.value if isinstance(self.status_code, HttpStatus) else self.status_code
+            status=status
         )
+        if etag:
+            self['ETag'] = etag
+
+    def _stream(self, data: Iterable, item_handler: Callable | None, status: int, chunk_size: int) -> Iterator[bytes]:
+        envelope = {
+            'status_code': status,
+            'error_type': None,
+            'error_code': None,
+            'error_message': None,
+            'show_type': ShowType.SILENT,
+            'success': self.success,
+            'host': self.host,
+        }
+        # 去掉开头的 { ，拼接在数据列表之后
+        tail = json_backend.dumps(camelize(envelope))[1:]
+        yield '{"data":['.encode('utf-8')
+        iterator = iter(data)
+        separator = ''
+        while chunk := list(islice(iterator, chunk_size)):
+            if item_handler:
+                chunk = [item_handler(item) for item in chunk]
+            content = ','.join(json_backend.dumps(camelize(item)) for item in chunk)
+            yield f'{separator}{content}'.encode('utf-8')
+            separator = ','
+        yield f'],{tail}'.encode('utf-8')
+
+
+def make_etag(*parts) -> str:
+    """根据版本号、查询参数等生成强ETag"""
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def etag_matches(request, etag: str) -> bool:
+    """判断请求头 If-None-Match 是否包含当前ETag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in [item.strip().removeprefix('W/') for item in header.split(',')]
+
+
+def not_modified(etag: str) -> DjangoHttpResponse:
+    """返回不带响应体的304响应"""
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+# 分页接口单页最多返回的数据量
+MAX_PAGE_SIZE = 100
+
+
+def valid_page_size(page_size: int) -> bool:
+    """校验每页数据量，用于分页参数的 filter_func"""
+    return 0 < page_size <= MAX_PAGE_SIZE
 
 
 def paginate_data(data:QuerySet, current:int, page_size:int=10, item_handler:Callable=None) -> Dict[str, Any]:
@@ -155,7 +275,7 @@ def paginate_data(data:QuerySet, current:int, page_size:int=10, item_handler:Cal
     total_count = paginator.count
     total_pages = paginator.num_pages
 
-    paginated_data = paginator.page(current).object_list
+    paginated_data = list(paginator.page(current).object_list)
 
     if item_handler:
         paginated_data = [item_handler(item) for item in paginated_data]
@@ -166,4 +286,91 @@ def paginate_data(data:QuerySet, current:int, page_size:int=10, item_handler:Cal
         'pageSize': page_size,
         'totalCount': total_count,
         'totalPages': total_pages
-    }
\ No newline at end of file
+    }
+
+
+def encode_cursor(key_value: str, last_id: int) -> str:
+    """生成不透明的分页游标"""
+    return base64.urlsafe_b64encode(json.dumps([key_value, last_id]).encode('utf-8')).decode('ascii')
+
+
+def _clean_cursor_value(field, value: Any, value_type: type) -> Any:
+    """按字段类型转换游标中的值，类型或范围不合法时抛出 ValidationError"""
+    if type(value) is not value_type:
+        raise ValidationError(f'cursor value must be {value_type.__name__}')
+    value = field.to_python(value)
+    field.run_validators(value)
+    return value
+
+
+def decode_cursor(cursor: str, model: type[Model], ordering: str = 'id') -> Tuple[Any, int] | None:
+    """解析分页游标，按排序字段及主键的类型转换游标中的值，游标不合法时返回None
+
+    Args:
+        cursor (str): 上一页返回的 nextCursor
+        model (type[Model]): 分页数据的模型
+        ordering (str, optional): 排序字段，同 paginate_cursor. Defaults to 'id'.
+    """
+    try:
+        key_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        key_field = model._meta.get_field(ordering.lstrip('-'))
+        # encode_cursor 中排序字段的值为 value_to_string 的结果，主键为整数
+        return _clean_cursor_value(key_field, key_value, str), _clean_cursor_value(model._meta.pk, last_id, int)
+    except (ValueError, TypeError, UnicodeError, ValidationError):
+        return None
+
+
+def valid_cursor(model: type[Model], ordering: str = 'id') -> Callable[[str], bool]:
+    """生成校验分页游标的函数，用于 Argument 的 filter_func，空字符串表示第一页"""
+    return lambda cursor: cursor == '' or decode_cursor(cursor, model, ordering) is not None
+
+
+def paginate_cursor(data:QuerySet, cursor:str|None, page_size:int=10, ordering:str='id', item_handler:Callable=None, with_count:bool=False) -> Dict[str, Any]:
+    """根据游标返回分页数据，按 (ordering, id) 定位下一页起点，不使用 OFFSET，任意深度的分页代价相同
+
+    Args:
+        data (QuerySet): 需要分页的数据
+        cursor (str | None): 上一页返回的 nextCursor，为空时返回第一页，不合法时抛出 ValueError，需先通过 valid_cursor 校验
+        page_size (int, optional): 每页数据量. Defaults to 10.
+        ordering (str, optional): 排序字段，前缀 - 表示倒序，相同值按 id 继续排序. Defaults to 'id'.
+        item_handler (Callable, optional): 对每条数据进行处理的函数. Defaults to None.
+        with_count (bool, optional): 是否返回总数，需要额外执行 COUNT 查询. Defaults to False.
+
+    Returns:
+        Dict[str, Any]: 分页数据，nextCursor 为空表示没有更多数据
+    """
+    if not valid_page_size(page_size):
+        raise ValueError(f'page_size must be between 1 and {MAX_PAGE_SIZE}')
+    descending = ordering.startswith('-')
+    key = ordering.lstrip('-')
+    total_count = data.count() if with_count else None
+
+    orderings = [ordering] if key == 'id' else [ordering, '-id' if descending else 'id']
+    data = data.order_by(*orderings)
+    position = decode_cursor(cursor, data.model, ordering) if cursor else None
+    if cursor and position is None:
+        raise ValueError('invalid cursor')
+    if position is not None:
+        key_value, last_id = position
+        lookup = 'lt' if descending else 'gt'
+        seek = Q(**{f'id__{lookup}': last_id})
+        if key != 'id':
+            seek = Q(**{f'{key}__{lookup}': key_value}) | (Q(**{key: key_value}) & seek)
+        data = data.filter(seek)
+
+    items = list(data[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(last._meta.get_field(key).value_to_string(last), last.id)
+
+    if item_handler:
+        items = [item_handler(item) for item in items]
+
+    return {
+        'list': items,
+        'pageSize': page_size,
+        'nextCursor': next_cursor,
+        'totalCount': total_count
+    }
@@ -0,0 +1,137 @@
+"""Json序列化后端
+
+JsonResponse、JsonParser 等统一通过本模块进行 json 编解码。
+安装了 orjson 时优先使用 orjson，否则使用标准库 json。
+两种后端输出的字节内容一致：紧凑分隔符、不转义中文，datetime/arrow/Decimal/Enum
+的转换规则与 JsonEncoder 相同，NaN、Infinity 输出为 null。
+
+示例:
+    from libs.boost import json_backend
+
+    json_backend.dumps({'a': 1})
+    json_backend.use_backend('json')
+"""
+import json
+import math
+import re
+from decimal import Decimal
+from typing import Any, Callable, Dict, NamedTuple
+from .extend import JsonEncoder
+
+SEPARATORS = (',', ':')
+
+
+class JsonBackend(NamedTuple):
+    """编解码函数，dumps 返回 str，loads 接受 str 或 bytes"""
+    dumps: Callable[[Any], str]
+    loads: Callable[[str | bytes], Any]
+
+
+_backends: Dict[str, JsonBackend] = {}
+_current: JsonBackend | None = None
+_current_name: str | None = None
+
+
+def register_backend(name: str, backend: JsonBackend, activate: bool = False):
+    """注册后端
+
+    Args:
+        name (str): 后端名称
+        backend (JsonBackend): 编解码函数
+        activate (bool, optional): 是否立即启用. Defaults to False.
+    """
+    _backends[name] = backend
+    if activate or _current is None:
+        use_backend(name)
+
+
+def use_backend(name: str):
+    """切换当前使用的后端，后端不存在时抛出 KeyError"""
+    global _current, _current_name
+    _current = _backends[name]
+    _current_name = name
+
+
+def get_backend() -> str:
+    """当前使用的后端名称"""
+    return _current_name
+
+
+def dumps(obj: Any) -> str:
+    return _current.dumps(obj)
+
+
+def loads(data: str | bytes) -> Any:
+    return _current.loads(data)
+
+
+def _finite(obj: Any) -> Any:
+    """将 NaN、Infinity 替换为 None"""
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    if isinstance(obj, Decimal) and not obj.is_finite():
+        return None
+    return obj
+
+
+def _json_dumps(obj: Any) -> str:
+    try:
+        return json.dumps(obj, cls=JsonEncoder, ensure_ascii=False, separators=SEPARATORS, allow_nan=False)
+    except ValueError as e:
+        # NaN、Infinity 不是合法的 json，与 orjson 一致输出为 null，只在出现时才遍历数据
+        if not str(e).startswith('Out of range float values'):
+            raise
+        return json.dumps(_finite(obj), cls=JsonEncoder, ensure_ascii=False, separators=SEPARATORS, allow_nan=False)
+
+
+register_backend('json', JsonBackend(_json_dumps, json.loads))
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _encoder = JsonEncoder()
+    # datetime、dataclass 交由 JsonEncoder 处理，保证与标准库输出一致
+    _ORJSON_OPTION = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+    # orjson 会将超出64位的整数解析为浮点数，含19位以上数字时交由标准库解析
+    _LONG_DIGITS_RE = re.compile(r'\d{19,}')
+    _LONG_DIGITS_BYTES_RE = re.compile(rb'\d{19,}')
+
+    # orjson 输出科学计数法时省略指数的正号和前导零，例如 1e16、1e-7，标准库为 1e+16、1e-07
+    # 先按 e 开头的字面量查找，再检查前一个字符是否为数字，比直接匹配数字开头的正则快得多
+    _EXPONENT_RE = re.compile(rb'e[-\d]')
+
+    def _has_exponent(content: bytes) -> bool:
+        return any(48 <= content[match.start() - 1] <= 57 for match in _EXPONENT_RE.finditer(content))
+
+    def _orjson_default(obj: Any) -> Any:
+        value = _encoder.default(obj)
+        # Decimal('NaN') 等转换得到的非有限浮点数与标准库后端一致输出为 null
+        if type(value) is float and not math.isfinite(value):
+            return None
+        return value
+
+    def _orjson_dumps(obj: Any) -> str:
+        try:
+            content = orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTION)
+        except orjson.JSONEncodeError:
+            # 超出64位的整数等 orjson 不支持的内容交由标准库处理
+            return _json_dumps(obj)
+        # 含科学计数法的数字时交由标准库输出，字符串中的类似内容只会多一次标准库编码
+        if _has_exponent(content):
+            return _json_dumps(obj)
+        return content.decode('utf-8')
+
+    def _orjson_loads(data: str | bytes) -> Any:
+        pattern = _LONG_DIGITS_RE if isinstance(data, str) else _LONG_DIGITS_BYTES_RE
+        if pattern.search(data):
+            return json.loads(data)
+        return orjson.loads(data)
+
+    register_backend('orjson', JsonBackend(_orjson_dumps, _orjson_loads), activate=True)
@@ -3,8 +3,12 @@ import threading
 import time
 import traceback
 import uuid
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 from loguru import logger
+from . import json_backend
+from .compression import compress, compress_stream, negotiate_encoding, weak_etag
 from .utils import underscoreize, camelize
 
 REQUEST_POST_PROCESS_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
@@ -43,7 +47,7 @@ class CamelToSnakeMiddleware(MiddlewareMixin):
             # 非form格式请求均尝试通过json解析
             if not request.content_type in REQUEST_POST_PROCESS_TYPES:
                 try:
-                    data = json.loads(request.body.decode('utf-8'))
+                    data = json_backend.loads(request.body)
                     snake_case_data = underscoreize(data)
                     request._body = snake_case_data
                 except json.JSONDecodeError:
@@ -60,14 +64,48 @@ class CamelToSnakeMiddleware(MiddlewareMixin):
             raise NotImplementedError(f"Unsupported request method: {request.method}")
 
     def process_response(self, request, response):
-        if 'application/json' in response['Content-Type']:
+        # 输出时已完成驼峰转换的响应（JsonResponse 及流式响应）无需再处理
+        if getattr(response, 'camelized', False):
+            return response
+        if 'application/json' in response.get('Content-Type', ''):
             content = response.content.decode('utf-8')
-            modified_content = camelize(json.loads(content))
-            modified_content_en = json.dumps(modified_content).encode('utf-8')
+            modified_content = camelize(json_backend.loads(content))
+            modified_content_en = json_backend.dumps(modified_content).encode('utf-8')
             response.content = modified_content_en
         return response
 
 
+class CompressionMiddleware(MiddlewareMixin):
+    """根据 Accept-Encoding 压缩Json响应，支持 gzip 及 br
+    请将该中间件放置在其他会读取或修改响应内容的中间件之前
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code != 200:
+            return response
+        if 'application/json' not in response.get('Content-Type', ''):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_LENGTH:
+                return response
+            content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        if response.has_header('ETag'):
+            response['ETag'] = weak_etag(response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
+
+
 class LogRequestMiddleware(MiddlewareMixin):
     """请求过程日志
     """
@@ -1,6 +1,7 @@
-import json
-from dataclasses import dataclass
-from typing import Any, Callable, Type
+from dataclasses import dataclass, field
+from typing import Any, Callable, Tuple, Type
+from django.db.models import Model, QuerySet
+from libs.boost import json_backend
 from libs.boost.extend import AttrDict
 from libs.boost.types import JsonParserExtendSettings
 
@@ -13,9 +14,58 @@ class ParseError(BaseException):
         self.message = message
 
 
+def _convert_int(value):
+    return value if isinstance(value, int) else int(value)
+
+
+def _convert_str(value):
+    return value if isinstance(value, str) else str(value)
+
+
+def _convert_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lower = value.lower()
+        if lower in ('true', 'false'):
+            return lower == 'true'
+        return value
+    return bool(value)
+
+
+def _make_container_converter(data_type: Type) -> Callable:
+    def convert(value):
+        if isinstance(value, data_type):
+            return value
+        if isinstance(value, str):
+            value = json_backend.loads(value)
+            assert isinstance(value, data_type)
+            return value
+        return data_type(value)
+    return convert
+
+
+def _make_generic_converter(data_type: Type) -> Callable:
+    def convert(value):
+        return value if isinstance(value, data_type) else data_type(value)
+    return convert
+
+
+# 常用类型的专用转换函数，与 Argument._check_type 的转换规则一致
+_CONVERTERS = {
+    int: _convert_int,
+    str: _convert_str,
+    bool: _convert_bool,
+    list: _make_container_converter(list),
+    dict: _make_container_converter(dict),
+}
+
+
 @dataclass
 class Argument(object):
     """需要校验的参数对象，用来解析对象内容是否满足后端设定需求
+
+    创建时根据 data_type 选定专用的类型转换函数，参数存在且不为空时直接走转换及校验。
     """
     name: str
     default: Any = None
@@ -25,15 +75,33 @@ class Argument(object):
     filter_func: Callable | None = None
     handler_func: Callable | None = None
     help: str = None
+    _convert: Callable = field(init=False, repr=False, compare=False, default=None)
+
+    def __post_init__(self):
+        self._convert = _CONVERTERS.get(self.data_type) or _make_generic_converter(self.data_type)
+
+    @property
+    def key(self) -> str:
+        """解析结果中使用的键名"""
+        return self.name
 
     def parse(self, has_key, value):
         """解析参数
         """
-        self._check_kv(has_key, value)
-        if self.required or value is not None:
-            value = self._check_type(value)
         if value is None:
-            return None
+            return self._parse_empty(has_key, value)
+        return self._validate(self._convert_value(value))
+
+    def _convert_value(self, value):
+        try:
+            return self._convert(value)
+        except (TypeError, ValueError, AssertionError):
+            raise ParseError(
+                self.help or 'Type Error: %s type must be %s' % (self.name, self.data_type))
+
+    def _validate(self, value):
+        """执行 filter_func 及 handler_func
+        """
         if self.filter_func:
             if not self.filter_func(value):
                 raise ParseError(
@@ -42,6 +110,16 @@ class Argument(object):
             value = self.handler_func(value)
         return value
 
+    def _parse_empty(self, has_key, value):
+        """参数不存在或为空时的解析
+        """
+        self._check_kv(has_key, value)
+        if self.required or value is not None:
+            value = self._check_type(value)
+        if value is None:
+            return None
+        return self._validate(value)
+
     def _check_kv(self, has_key, value):
         """检查key和value
         """
@@ -63,7 +141,7 @@ class Argument(object):
         """
         try:
             if self.data_type in (list, dict) and isinstance(value, str):
-                value = json.loads(value)
+                value = json_backend.loads(value)
                 assert isinstance(value, self.data_type)
             elif self.data_type == bool and isinstance(value, str):
                 if value.lower() in ('true', 'false'):
@@ -76,6 +154,43 @@ class Argument(object):
                 self.help or 'Type Error: %s type must be %s' % (self.name, self.data_type))
 
 
+@dataclass
+class ModelArgument(Argument):
+    """解析为模型实例的参数
+
+    参数值按 data_type 转换后只查询一次对应的模型实例，解析结果为实例本身，
+    filter_func、handler_func 接收的也是实例。实例不存在（包括已被软删除）时解析失败。
+
+    示例:
+        JsonParser(
+            ModelArgument('id', model=Plugin, dest='plugin', select_related=('latest_version',)),
+        ).parse(request.GET)
+    """
+    data_type: Type = int
+    model: Type[Model] | None = None
+    queryset: QuerySet | None = None     # 自定义查询集，默认为 model 的默认 manager
+    select_related: Tuple[str, ...] = ()
+    lookup: str = 'pk'
+    dest: str | None = None              # 解析结果中使用的键名，默认与参数名一致
+
+    @property
+    def key(self) -> str:
+        return self.dest or self.name
+
+    def parse(self, has_key, value):
+        if value is None:
+            return self._parse_empty(has_key, value)
+        value = self._convert_value(value)
+        queryset = self.queryset if self.queryset is not None else self.model._default_manager.all()
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        obj = queryset.filter(**{self.lookup: value}).first()
+        if obj is None:
+            raise ParseError(
+                self.help or 'Value Error: %s object does not exist' % self.name)
+        return self._validate(obj)
+
+
 class BaseParser(object):
     """参数解析器基类"""
 
@@ -88,7 +203,7 @@ class BaseParser(object):
                 raise TypeError('%r is not instance of Argument' % e)
             self.args.append(e)
 
-    def _get(self, key):
+    def _get(self, data, key):
         raise NotImplementedError
 
     def _init(self, data):
@@ -98,14 +213,18 @@ class BaseParser(object):
         self.args.append(Argument(**kwargs))
 
     def parse(self, data=None, clear=False):
+        """解析数据
+
+        解析过程不在解析器上保存状态，同一个解析器可以声明在类属性中被多个请求复用
+        """
         rst = AttrDict()
         try:
-            self._init(data)
+            data = self._init(data)
             for e in self.args:
-                has_key, value = self._get(e.name)
+                has_key, value = self._get(data, e.name)
                 if clear and has_key is False and e.required is False:
                     continue
-                rst[e.name] = e.parse(has_key, value)
+                rst[e.key] = e.parse(has_key, value)
         except ParseError as err:
             return None, err.message
         return rst, None
@@ -114,22 +233,17 @@ class BaseParser(object):
 class JsonParser(BaseParser):
     """Json解析器"""
 
-    def __init__(self, *args):
-        self.__data = None
-        super(JsonParser, self).__init__(*args)
-
-    def _get(self, key):
-        return key in self.__data, self.__data.get(key)
+    def _get(self, data, key):
+        return key in data, data.get(key)
 
     def _init(self, data):
         try:
             if isinstance(data, (str, bytes)):
-                self.__data = json.loads(data) if data else {}
-            else:
-                assert hasattr(data, '__contains__')
-                assert hasattr(data, 'get')
-                assert callable(data.get)
-                self.__data = data
+                return json_backend.loads(data) if data else {}
+            assert hasattr(data, '__contains__')
+            assert hasattr(data, 'get')
+            assert callable(data.get)
+            return data
         except (ValueError, AssertionError):
             raise ParseError('Invalid data type')
 
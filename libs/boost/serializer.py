@@ -0,0 +1,140 @@
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Type
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, Model, Prefetch, QuerySet
+
+
+class Field(object):
+    """DTO字段声明
+
+    Args:
+        source (str, optional): 取值路径，使用 . 跨越关联关系，如 plugin.name、tags.text. Defaults to 字段名.
+        serializer (Type[Serializer], optional): 关联对象使用的嵌套Serializer. Defaults to None.
+        handler (Callable, optional): 对取到的值进行处理的函数. Defaults to None.
+    """
+
+    def __init__(self, source: str = None, serializer: Type['Serializer'] = None, handler: Callable = None):
+        self.source = source
+        self.serializer = serializer
+        self.handler = handler
+        self.segments: List[str] = source.split('.') if source else []
+
+    def paths(self) -> List[List[str]]:
+        """字段依赖的全部取值路径，包含嵌套Serializer的路径"""
+        if self.serializer is None:
+            return [self.segments]
+        return [self.segments + path for path in self.serializer.paths()]
+
+
+class Serializer(object):
+    """声明式DTO基类
+
+    子类通过 Field 声明输出字段，optimize 根据字段的取值路径自动为查询集生成
+    select_related / prefetch_related / only，使序列化一页数据的查询次数固定。
+    取值路径中不是模型字段的名称（如 annotate 的结果）按普通属性读取，不参与查询规划。
+
+    示例:
+        class TagDTO(Serializer):
+            model = Tag
+            id = Field()
+            text = Field()
+
+        TagDTO.serialize_many(TagDTO.optimize(Tag.objects.all()))
+    """
+    model: Type[Model] = None
+    fields: Dict[str, Field] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = dict(cls.fields)
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, Field):
+                if not value.segments:
+                    value.segments = [name]
+                fields[name] = value
+        cls.fields = fields
+
+    @classmethod
+    def paths(cls) -> List[List[str]]:
+        return [path for field in cls.fields.values() for path in field.paths()]
+
+    @classmethod
+    def optimize(cls, queryset: QuerySet = None) -> QuerySet:
+        """根据字段声明为查询集添加关联查询及字段裁剪
+
+        Args:
+            queryset (QuerySet, optional): 需要优化的查询集. Defaults to model 的全部数据.
+
+        Returns:
+            QuerySet: 优化后的查询集
+        """
+        if queryset is None:
+            queryset = cls.model.objects.all()
+        return _apply_plan(queryset, cls.model, cls.paths())
+
+    @classmethod
+    def serialize(cls, obj) -> Dict[str, Any]:
+        dto = {}
+        for name, field in cls.fields.items():
+            value = _resolve(obj, field.segments, field.serializer)
+            dto[name] = field.handler(value) if field.handler else value
+        return dto
+
+    @classmethod
+    def serialize_many(cls, objs: Iterable) -> List[Dict[str, Any]]:
+        return [cls.serialize(obj) for obj in objs]
+
+
+def _resolve(value, segments: List[str], serializer: Type[Serializer] | None):
+    """按路径取值，遇到一对多/多对多关系时展开为列表"""
+    for index, segment in enumerate(segments):
+        if value is None:
+            return None
+        value = getattr(value, segment)
+        if isinstance(value, Manager):
+            rest = segments[index + 1:]
+            return [_resolve(item, rest, serializer) for item in value.all()]
+    if serializer is not None and value is not None:
+        return serializer.serialize(value)
+    return value
+
+
+def _apply_plan(queryset: QuerySet, model: Type[Model], paths: List[List[str]], extra_only: Tuple[str, ...] = ()) -> QuerySet:
+    only, selects, prefetches = [], [], []
+    complete = _collect_plan(model, paths, '', only, selects, prefetches)
+    if selects:
+        queryset = queryset.select_related(*selects)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    # 存在需要完整对象的路径时不做字段裁剪，避免访问被延迟加载的字段时产生额外查询
+    if complete:
+        queryset = queryset.only(*extra_only, *only)
+    return queryset
+
+
+def _collect_plan(model: Type[Model], paths: List[List[str]], prefix: str, only: List[str], selects: List[str], prefetches: List[Prefetch]) -> bool:
+    """收集查询规划，返回是否可以对该模型进行字段裁剪"""
+    complete = True
+    groups: Dict[str, List[List[str]]] = {}
+    for path in paths:
+        if not path:
+            complete = False
+            continue
+        groups.setdefault(path[0], []).append(path[1:])
+    for name, sub_paths in groups.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.many_to_many or field.one_to_many:
+            related_model = field.related_model
+            # 反向外键需要保留外键字段，prefetch 才能将结果关联回父对象
+            extra_only = (field.field.name,) if field.one_to_many else ()
+            queryset = _apply_plan(related_model._default_manager.all(), related_model, sub_paths, extra_only)
+            prefetches.append(Prefetch(prefix + name, queryset=queryset))
+        elif field.is_relation:
+            selects.append(prefix + name)
+            only.append(prefix + name)
+            complete = _collect_plan(field.related_model, sub_paths, f'{prefix}{name}__', only, selects, prefetches) and complete
+        else:
+            only.append(prefix + name)
+    return complete
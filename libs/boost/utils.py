@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 from django.core.files import File
 from django.http import QueryDict
@@ -7,6 +8,14 @@ from django.utils.encoding import force_str
 from django.utils.functional import Promise
 from typing import Match, Dict, Any, List
 
+# 键名转换缓存的容量，接口使用的键名是一个较小的固定集合，命中率接近100%
+KEY_CACHE_SIZE = 4096
+
+CAMELIZE_RE = re.compile(r"[a-zA-Z0-9]?_[a-zA-Z0-9]")
+UNDERSCOREIZE_RE = re.compile(r"([a-z0-9]|[A-Z]?(?=[A-Z0-9](?=[a-z0-9]|(?<![A-Z])$)))([A-Z]|(?<=[a-z])[0-9]"
+                              r"(?=[0-9A-Z]|$)|(?<=[A-Z])[0-9](?=[0-9]|$))")
+UNDERSCOREIZE_RE_NO_NUMBER = re.compile(r"([a-z0-9]|[A-Z]?(?=[A-Z](?=[a-z])))([A-Z])")
+
 
 def underscore_to_camel(match: Match[str]) -> str:
     """
@@ -53,11 +62,40 @@ def get_underscoreize_re(options: Dict[str, Any]) -> re.Pattern:
         re.Pattern: 编译后的正则表达式模式。
     """
     if options.get("no_underscore_before_number"):
-        pattern = r"([a-z0-9]|[A-Z]?(?=[A-Z](?=[a-z])))([A-Z])"
-    else:
-        pattern = (r"([a-z0-9]|[A-Z]?(?=[A-Z0-9](?=[a-z0-9]|(?<![A-Z])$)))([A-Z]|(?<=[a-z])[0-9]"
-                   r"(?=[0-9A-Z]|$)|(?<=[A-Z])[0-9](?=[0-9]|$))")
-    return re.compile(pattern)
+        return UNDERSCOREIZE_RE_NO_NUMBER
+    return UNDERSCOREIZE_RE
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def camelize_key(key: str) -> str:
+    """
+    将下划线分隔的键名转换为驼峰格式，结果会被缓存。
+
+    参数:
+        key (str): 要转换的键名。
+
+    返回:
+        str: 转换后的驼峰格式键名。
+    """
+    if "_" not in key:
+        return key
+    return CAMELIZE_RE.sub(underscore_to_camel, key)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def underscoreize_key(key: str, no_underscore_before_number: bool = False) -> str:
+    """
+    将驼峰格式的键名转换为下划线分隔格式，结果会被缓存。
+
+    参数:
+        key (str): 要转换的键名。
+        no_underscore_before_number (bool): 数字前是否不添加下划线。
+
+    返回:
+        str: 转换后的下划线分隔键名。
+    """
+    underscoreize_re = UNDERSCOREIZE_RE_NO_NUMBER if no_underscore_before_number else UNDERSCOREIZE_RE
+    return underscoreize_re.sub(r"\1_\2", key).lower().lstrip("_")
 
 
 def camel_to_underscore(name: str, **options: Any) -> str:
@@ -71,8 +109,7 @@ def camel_to_underscore(name: str, **options: Any) -> str:
     返回:
         str: 转换后的下划线分隔字符串。
     """
-    underscoreize_re = get_underscoreize_re(options)
-    return underscoreize_re.sub(r"\1_\2", name).lower().lstrip("_")
+    return underscoreize_key(name, bool(options.get("no_underscore_before_number")))
 
 
 def _get_iterable(data: QueryDict | Dict[str, Any]) -> List | Dict[str, Any]:
@@ -119,10 +156,9 @@ def camelize(data, **options):
             if isinstance(key, Promise):
                 key = force_str(key)
 
-            # 判断键是否为字符串且包含下划线，如果是则转换为驼峰命名。
-            if isinstance(key, str) and "_" in key:
-                camelize_re = re.compile(r"[a-zA-Z0-9]?_[a-zA-Z0-9]")
-                new_key = re.sub(camelize_re, underscore_to_camel, key)
+            # 判断键是否为字符串，如果是则转换为驼峰命名，转换结果会被缓存。
+            if isinstance(key, str):
+                new_key = camelize_key(key)
             else:
                 new_key = key
 
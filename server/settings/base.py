@@ -102,6 +102,7 @@ middleware
     'django.middleware.csrf.CsrfViewMiddleware',
 """
 INSTALLED_APPS = [
+    'django.contrib.postgres',
     'corsheaders',
     'apps.account',
     'apps.plugin',
@@ -111,6 +112,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'libs.boost.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'libs.boost.middleware.HandleExceptionMiddleware',
@@ -160,6 +162,12 @@ AUTHENTICATION_EXCLUDES = (
 # token过期时间
 AUTHENTICATION_EXPIRE_TIME = 3600 * 24 * 7
 
+# token对应账户的缓存时间（秒），进程内缓存，账户状态变化在其他进程的只读请求中最多延迟该时间生效，写请求不使用缓存
+AUTHENTICATION_CACHE_TIMEOUT = 60
+
+# token过期时间延长超过该值（秒）时才写入数据库
+AUTHENTICATION_REFRESH_THRESHOLD = 3600
+
 # 邮箱验证码过期时间
 VERIFY_CODE_EXPIRED = 5
 
@@ -197,3 +205,33 @@ DEFAULT_EMAIL_PASSWORD = os.environ.get('DEFAULT_EMAIL_PASSWORD')
 # 文件上传配置
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # MEDIA_URL = '/media/'
+
+"""
+插件目录缓存配置
+"""
+# 目录缓存过期时间（秒），目录发生写操作时版本号变化，缓存会提前失效
+CATALOG_CACHE_TIMEOUT = 3600
+
+# 按使用次数排序的目录缓存分段时长（秒），使用次数累加时不更新目录版本号，排序最多延迟该时间
+CATALOG_USE_COUNT_WINDOW = 300
+
+"""
+响应压缩配置
+"""
+# 小于该长度（字节）的响应不压缩
+COMPRESSION_MIN_LENGTH = 1024
+
+"""
+操作记录写入配置
+"""
+# 每个 worker 缓冲的操作记录达到该数量时批量写入
+OPERATION_LOG_BUFFER_SIZE = 200
+
+# 缓冲区最长写入间隔（秒），由 gunicorn worker 中的后台线程定时写入
+OPERATION_LOG_FLUSH_INTERVAL = 5
+
+# 操作记录按月分区，plugin partition 命令预先创建之后几个月的分区
+OPERATION_LOG_PARTITION_AHEAD = 3
+
+# 原始操作记录保留的月数，plugin detach 命令分离更早的分区（已按天汇总）
+OPERATION_LOG_RETENTION_MONTHS = 13
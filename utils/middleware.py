@@ -2,23 +2,42 @@ from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from loguru import logger
-from apps.account.models import Account
+from apps.account.cache import delete_token_session, get_token_session, refresh_token_expired, set_token_session
+from apps.account.models import AccountSession
 from const.error import ErrorType
 from libs.boost.http import HttpStatus, JsonResponse
 
 class AuthenticationMiddleware(MiddlewareMixin):
     """用户认证
     """
-    def get_current_account(self, request):
-        """获取当前请求的用户"""
-        
-        account = None
+    # 只读请求使用进程内缓存的会话
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def get_current_session(self, request):
+        """获取当前请求的会话
+
+        会话缓存为进程内缓存，在其他 worker 中吊销或禁用后，只读请求最多延迟 AUTHENTICATION_CACHE_TIMEOUT 秒失效，
+        写请求每次从数据库读取会话，吊销后立即失效
+        """
+
+        session = None
         access_token = request.headers.get('X-Token') or request.GET.get('X-Token')
         if access_token is None:
             logger.error(f"权限校验未通过，缺少X-Token: {access_token}")
         if access_token and len(access_token) == 32:
-            account = Account.objects.filter(access_token=access_token).first()
-        return account
+            token_hash = AccountSession.hash_token(access_token)
+            if request.method in self.SAFE_METHODS:
+                session = get_token_session(token_hash)
+            if session is None:
+                # 通过 token_hash 唯一索引查询，同时关联账户
+                session = AccountSession.objects.select_related('account').filter(
+                    token_hash=token_hash, account__deleted_at__isnull=True).first()
+                # 只缓存可用的会话，禁用及过期的账户每次都从数据库读取
+                if session is not None and session.account.is_active and session.expired >= timezone.now():
+                    set_token_session(session)
+                else:
+                    delete_token_session(token_hash)
+        return session
 
     def process_request(self, request):
         # 请求地址满足 AUTHENTICATION_EXCLUDES，或符合正则表达，则不使用该中间件验证请求
@@ -27,15 +46,16 @@ class AuthenticationMiddleware(MiddlewareMixin):
         elif any(x.match(request.path) for x in settings.AUTHENTICATION_EXCLUDES if hasattr(x, 'match')):
             return None
 
-        account = self.get_current_account(request)
-        if account is not None:
+        session = self.get_current_session(request)
+        if session is not None:
+            account = session.account
             # 用户被禁用或者已经被删除
             if not account.is_active:
                 return JsonResponse(error_type=ErrorType.ACCOUNT_DISABLED, status_code=HttpStatus.HTTP_401_UNAUTHORIZED)
-            if account.is_active and account.token_expired >= timezone.now():
+            if session.expired >= timezone.now():
                 request.account = account
-                # 可自行定制token更新规则
-                account.token_expired = timezone.now() + timezone.timedelta(seconds=settings.AUTHENTICATION_EXPIRE_TIME)
-                account.save()
+                request.account_session = session
+                # 可自行定制token更新规则，有效期变化超过阈值时才写入数据库
+                refresh_token_expired(session)
                 return None
         return JsonResponse(error_type=ErrorType.TOKEN_EXPIRED, status_code=HttpStatus.HTTP_401_UNAUTHORIZED)